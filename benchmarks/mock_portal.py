@@ -0,0 +1,229 @@
+"""Local stand-in for the Águas de Coimbra portal.
+
+Serves the four endpoints used by AdCClient with synthetic hourly readings,
+and can add latency and errors to every answer. Run it on its own with
+
+    python -m benchmarks.mock_portal --accounts 3 --latency 0.2
+
+and log in as user1 .. userN with password "secret".
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import uuid
+import zlib
+from collections import Counter
+from datetime import date, datetime, timedelta, timezone
+
+from aiohttp import web
+
+PASSWORD = "secret"
+PREFIX = "/uPortal2/coimbra/"
+TOKEN_LIFETIME = timedelta(hours=1)
+# Readings show up on the portal this long after their hour ends
+PUBLICATION_LAG = timedelta(hours=1)
+TIMEZONE = timezone.utc
+
+
+def _litres(meter: str, hour: datetime) -> int:
+    """Deterministic consumption of a meter in an hour."""
+    if 1 <= hour.hour < 6:
+        return 0
+    return zlib.crc32(f"{meter}:{hour.isoformat()}".encode()) % 40
+
+
+class MockPortal:
+    """Synthetic portal with accounts user1 .. userN.
+
+    Every account has `subscriptions` subscriptions of `meters` meters each.
+    Every answer is delayed by `latency` seconds (plus up to `jitter`), and
+    fails with a 503 with probability `error_rate`.
+    """
+
+    def __init__(
+        self,
+        accounts: int = 1,
+        subscriptions: int = 1,
+        meters: int = 1,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        seed: int = 0,
+    ) -> None:
+        self.accounts = {
+            f"user{account}": [
+                f"{account}{subscription:02d}"
+                for subscription in range(1, subscriptions + 1)
+            ]
+            for account in range(1, accounts + 1)
+        }
+        self.meters = meters
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.requests: Counter[str] = Counter()
+        self._random = random.Random(seed)
+        self._tokens: dict[str, tuple[str, datetime]] = {}
+        self._runner: web.AppRunner | None = None
+        self.url = ""
+
+        self.app = web.Application(middlewares=[self._faults])
+        self.app.add_routes(
+            [
+                web.post(f"{PREFIX}login", self._login),
+                web.get(f"{PREFIX}Subscription/listSubscriptions", self._subscriptions),
+                web.get(f"{PREFIX}leituras/getContadores", self._meters),
+                web.get(f"{PREFIX}History/consumo/carga", self._usage),
+            ]
+        )
+
+    async def __aenter__(self) -> MockPortal:
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.stop()
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving and return the base URL to give AdCClient."""
+        self._runner = web.AppRunner(self.app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, host, port)
+        await site.start()
+        host, port = self._runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/"
+        return self.url
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @web.middleware
+    async def _faults(self, request: web.Request, handler) -> web.StreamResponse:
+        self.requests[request.path.removeprefix(PREFIX)] += 1
+        delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            await asyncio.sleep(delay)
+        if self._random.random() < self.error_rate:
+            raise web.HTTPServiceUnavailable()
+        return await handler(request)
+
+    def _account(self, request: web.Request) -> str:
+        """The account of the request's token, or a 401."""
+        token = self._tokens.get(request.headers.get("X-Auth-Token", ""))
+        if token is None or token[1] < datetime.now(TIMEZONE):
+            raise web.HTTPUnauthorized()
+        return token[0]
+
+    def _subscription_meters(self, request: web.Request) -> list[str]:
+        """Meter numbers of the subscription asked for, or a 404."""
+        subscription_id = request.query.get("subscriptionId", "")
+        if subscription_id not in self.accounts[self._account(request)]:
+            raise web.HTTPNotFound()
+        return [f"{subscription_id}{meter}" for meter in range(self.meters)]
+
+    async def _login(self, request: web.Request) -> web.Response:
+        credentials = await request.json()
+        if (
+            credentials.get("username") not in self.accounts
+            or credentials.get("password") != PASSWORD
+        ):
+            raise web.HTTPUnauthorized()
+        token = uuid.uuid4().hex
+        expiration = datetime.now(TIMEZONE) + TOKEN_LIFETIME
+        self._tokens[token] = (credentials["username"], expiration)
+        # Milliseconds, like the real portal
+        return web.json_response(
+            {"token": {"token": token, "expirationDate": expiration.timestamp() * 1000}}
+        )
+
+    async def _subscriptions(self, request: web.Request) -> web.Response:
+        subscriptions = self.accounts[self._account(request)]
+        return web.json_response(
+            [{"subscriptionId": subscription} for subscription in subscriptions]
+        )
+
+    async def _meters(self, request: web.Request) -> web.Response:
+        today = datetime.now(TIMEZONE).date()
+        return web.json_response(
+            [
+                {
+                    "chaveContador": {
+                        "codigoMarca": "MOCK",
+                        "codigoProduto": "P1",
+                        "numeroContador": meter,
+                    },
+                    "descModelo": "Mock meter / 15",
+                    "ultimaLeitura": {
+                        "leituras": [{"leitura": today.toordinal() % 1000}]
+                    },
+                }
+                for meter in self._subscription_meters(request)
+            ]
+        )
+
+    async def _usage(self, request: web.Request) -> web.Response:
+        meter = request.query.get("numeroContador")
+        if meter not in self._subscription_meters(request):
+            raise web.HTTPNotFound()
+        try:
+            initial_day = date.fromisoformat(request.query["initialDate"])
+            final_day = date.fromisoformat(request.query["finalDate"])
+        except (KeyError, ValueError):
+            raise web.HTTPBadRequest()
+
+        hour = datetime.combine(initial_day, datetime.min.time(), TIMEZONE)
+        end = min(
+            datetime.combine(
+                final_day + timedelta(days=1), datetime.min.time(), TIMEZONE
+            ),
+            datetime.now(TIMEZONE) - PUBLICATION_LAG - timedelta(hours=1),
+        )
+        readings = []
+        while hour < end:
+            readings.append(
+                {"date": hour.isoformat(), "consumption": _litres(meter, hour)}
+            )
+            hour += timedelta(hours=1)
+        return web.json_response(readings)
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    portal = MockPortal(
+        args.accounts,
+        args.subscriptions,
+        args.meters,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+    )
+    url = await portal.start(args.host, args.port)
+    print(f"Mock portal listening on {url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await portal.stop()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--subscriptions", type=int, default=1)
+    parser.add_argument("--meters", type=int, default=1)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    try:
+        asyncio.run(_serve(parser.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+"""Measure the cost of refreshing 1 to N accounts against the mock portal.
+
+For each number of accounts, every account is refreshed concurrently the
+way the coordinator tiers do it: one cold refresh, then --refreshes warm
+ones. Reported per refresh round: portal requests per account, wall time,
+CPU time and peak memory allocated.
+
+    python -m benchmarks.refresh --accounts 5 --latency 0.05
+    python -m benchmarks.refresh --save baseline.json
+    python -m benchmarks.refresh --compare baseline.json
+    python -m benchmarks.refresh --replay traffic.cassette.jsonl --realtime
+
+With --compare the run fails when requests per account grow, or when time
+or CPU grow by more than --tolerance, against the saved results. With
+--replay a single account is refreshed from a recorded cassette instead.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+import tracemalloc
+from collections import Counter
+
+from aiohttp import ClientSession
+
+from custom_components.aguas_de_coimbra.adc_client import AdCClient, AdCMeter
+from custom_components.aguas_de_coimbra.cassette import AdCReplaySession
+from custom_components.aguas_de_coimbra.const import REFRESH_DEADLINE
+
+from .mock_portal import PASSWORD, MockPortal
+
+
+async def _refresh_meter(meter: AdCMeter) -> None:
+    """Refresh every sensor value of a meter, like the three tiers do."""
+    await meter.update_usage()
+    await meter.get_consumption_day(today=True)
+    await meter.get_consumption_day(today=False)
+    consumption = await meter.get_consumption_billing_cycle()
+    meter.calculate_cost(consumption)
+    await meter.get_last_meter_reading()
+
+
+async def _refresh(client: AdCClient) -> None:
+    with client.deadline(REFRESH_DEADLINE):
+        meters = await client.discover_meters()
+        await asyncio.gather(*(_refresh_meter(meter) for meter in meters.values()))
+
+
+class _CountingReplaySession(AdCReplaySession):
+    """Replay a cassette, counting requests like the mock portal does."""
+
+    def __init__(self, path: str, realtime: bool) -> None:
+        super().__init__(path, realtime)
+        self.requests: Counter[str] = Counter()
+
+    def request(self, method: str, url: str, **kwargs):
+        self.requests[url] += 1
+        return super().request(method, url, **kwargs)
+
+
+async def _measure(portal, clients: list[AdCClient]) -> dict:
+    """Refresh every client once, concurrently."""
+    portal.requests.clear()
+    tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    start_cpu = time.process_time()
+    start = time.perf_counter()
+    await asyncio.gather(*(_refresh(client) for client in clients))
+    return {
+        "requests": sum(portal.requests.values()) / len(clients),
+        "seconds": time.perf_counter() - start,
+        "cpu_seconds": time.process_time() - start_cpu,
+        "peak_kib": (tracemalloc.get_traced_memory()[1] - start_memory) / 1024,
+    }
+
+
+async def _run_accounts(args: argparse.Namespace, accounts: int) -> dict:
+    async with MockPortal(
+        accounts,
+        args.subscriptions,
+        args.meters,
+        args.latency,
+        args.jitter,
+        args.error_rate,
+    ) as portal, ClientSession() as session:
+        clients = [
+            AdCClient(
+                username,
+                PASSWORD,
+                1,
+                False,
+                session,
+                base_url=portal.url,
+            )
+            for username in portal.accounts
+        ]
+        cold = await _measure(portal, clients)
+        warm = [await _measure(portal, clients) for _ in range(args.refreshes)]
+
+    result = {"accounts": accounts, "cold": cold}
+    if warm:
+        result["warm"] = {
+            key: statistics.median(round_[key] for round_ in warm) for key in cold
+        }
+    return result
+
+
+def _print(results: list[dict]) -> None:
+    print(
+        f"{'accounts':>8} {'refresh':>7} {'req/acct':>9} {'wall ms':>9} "
+        f"{'cpu ms':>8} {'peak KiB':>9}"
+    )
+    for result in results:
+        for kind in ("cold", "warm"):
+            if kind not in result:
+                continue
+            values = result[kind]
+            print(
+                f"{result['accounts']:>8} {kind:>7} {values['requests']:>9.1f} "
+                f"{values['seconds'] * 1000:>9.1f} "
+                f"{values['cpu_seconds'] * 1000:>8.1f} "
+                f"{values['peak_kib']:>9.1f}"
+            )
+
+
+def _regressions(results: list[dict], baseline: list[dict], tolerance: float) -> list:
+    """Describe every measure worse than the baseline."""
+    found = []
+    previous = {result["accounts"]: result for result in baseline}
+    for result in results:
+        old = previous.get(result["accounts"])
+        if old is None:
+            continue
+        for kind in ("cold", "warm"):
+            if kind not in result or kind not in old:
+                continue
+            new_values, old_values = result[kind], old[kind]
+            if new_values["requests"] > old_values["requests"]:
+                found.append(
+                    f"{result['accounts']} accounts, {kind}: requests per account "
+                    f"{old_values['requests']:.1f} -> {new_values['requests']:.1f}"
+                )
+            for key in ("seconds", "cpu_seconds"):
+                if new_values[key] > old_values[key] * (1 + tolerance):
+                    found.append(
+                        f"{result['accounts']} accounts, {kind}: {key} "
+                        f"{old_values[key]:.3f} -> {new_values[key]:.3f}"
+                    )
+    return found
+
+
+async def _run_replay(args: argparse.Namespace) -> dict:
+    session = _CountingReplaySession(args.replay, args.realtime)
+    client = AdCClient("replay", PASSWORD, 1, False, session)
+    result = {"accounts": 1, "cold": await _measure(session, [client])}
+    # Warm refreshes run for as long as the cassette has exchanges left
+    warm = []
+    for _ in range(args.refreshes):
+        try:
+            warm.append(await _measure(session, [client]))
+        except Exception:
+            break
+    if warm:
+        result["warm"] = {
+            key: statistics.median(round_[key] for round_ in warm)
+            for key in result["cold"]
+        }
+    return result
+
+
+async def _main(args: argparse.Namespace) -> int:
+    tracemalloc.start()
+    if args.replay:
+        results = [await _run_replay(args)]
+    else:
+        results = [
+            await _run_accounts(args, accounts)
+            for accounts in range(1, args.accounts + 1)
+        ]
+    tracemalloc.stop()
+    _print(results)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as file:
+            found = _regressions(results, json.load(file), args.tolerance)
+        for regression in found:
+            print(f"REGRESSION {regression}")
+        return 1 if found else 0
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=3)
+    parser.add_argument("--subscriptions", type=int, default=1)
+    parser.add_argument("--meters", type=int, default=1)
+    parser.add_argument("--refreshes", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--compare", help="fail on regressions against this file")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--replay", help="refresh from this recorded cassette")
+    parser.add_argument(
+        "--realtime", action="store_true", help="replay the recorded timings"
+    )
+    sys.exit(asyncio.run(_main(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,21 @@
 from __future__ import annotations
 
+import asyncio
+import logging
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.const import Platform
 from homeassistant.core import HomeAssistant
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN, STORAGE_VERSION, TIER_SLOW
+from .coordinator import AdCCoordinator, account_storage_key, entry_username
+from .services import async_setup_services, async_unload_services
 
-from .const import DOMAIN
-from .coordinator import AdCCoordinator
+_LOGGER = logging.getLogger(__name__)
 
 PLATFORMS: list[Platform] = [
+    Platform.BINARY_SENSOR,
     Platform.SENSOR,
 ]
 
@@ -15,23 +23,93 @@ PLATFORMS: list[Platform] = [
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Set up the integration via config flow."""
     hass.data.setdefault(DOMAIN, {})
+    # Entries of the same portal account share one coordinator
+    accounts = hass.data[DOMAIN].setdefault("accounts", {})
+    username = entry_username(entry)
 
-    # Create the coordinator
-    coordinator = AdCCoordinator(hass, entry)
+    # Entries are set up concurrently, the first one of an account creates
+    # the coordinator while the others wait for it
+    locks = hass.data[DOMAIN].setdefault("account_locks", {})
+    async with locks.setdefault(username, asyncio.Lock()):
+        account = accounts.get(username)
+        if account is None:
+            account = accounts[username] = await _async_setup_account(hass, entry)
+        account["entries"].add(entry.entry_id)
+    coordinator: AdCCoordinator = account["coordinator"]
 
-    # First data fetch
-    await coordinator.async_config_entry_first_refresh()
+    if coordinator.client.billing_cycle_start_day != entry.options.get(
+        "billing_cycle_start_day", entry.data.get("billing_cycle_start_day", 1)
+    ) or coordinator.client.social_tariff != entry.options.get(
+        "social_tariff", entry.data.get("social_tariff", False)
+    ):
+        _LOGGER.warning(
+            "Entries of the account %s have different billing settings, "
+            "using the settings of the first entry",
+            username,
+        )
 
-    hass.data[DOMAIN][entry.entry_id] = {"coordinator": coordinator}
+    hass.data[DOMAIN][entry.entry_id] = {
+        "coordinator": coordinator,
+        "username": username,
+    }
 
-    # Set up sensors
+    async_setup_services(hass)
+
+    # Set up sensors straight away with the last known values
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+
+    if account.pop("first_refresh", False):
+        # Owned by the account, so unloading this entry alone doesn't cancel it
+        coordinator.async_start()
     return True
 
 
+async def _async_setup_account(hass: HomeAssistant, entry: ConfigEntry) -> dict:
+    """Create the coordinator shared by every entry of a portal account."""
+
+    # Create the coordinator
+    coordinator = AdCCoordinator(hass, entry)
+
+    # Restore the state saved before the last restart
+    await coordinator.async_load_cache()
+
+    # Import the hourly consumption into the long-term statistics after each refresh
+    unsub_statistics = coordinator.tiers[TIER_SLOW].async_add_listener(
+        coordinator.async_schedule_statistics_import
+    )
+
+    return {
+        "coordinator": coordinator,
+        "entries": set(),
+        "unsub": [unsub_statistics, coordinator.async_shutdown],
+        "first_refresh": True,
+    }
+
+
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Unload adc config entry."""
     unload_ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if unload_ok:
-        hass.data[DOMAIN].pop(entry.entry_id)
+        username = hass.data[DOMAIN].pop(entry.entry_id)["username"]
+        account = hass.data[DOMAIN]["accounts"][username]
+        account["entries"].discard(entry.entry_id)
+        if not account["entries"]:
+            # Last entry of the account, stop polling the portal
+            for unsub in account["unsub"]:
+                unsub()
+            hass.data[DOMAIN]["accounts"].pop(username)
+        if not hass.data[DOMAIN]["accounts"]:
+            async_unload_services(hass)
     return unload_ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    """Delete the persistent cache once the last entry of an account is removed."""
+    # Cache kept per entry by earlier versions
+    await Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}").async_remove()
+    username = entry_username(entry)
+    if not any(
+        other.entry_id != entry.entry_id and entry_username(other) == username
+        for other in hass.config_entries.async_entries(DOMAIN)
+    ):
+        await Store(hass, STORAGE_VERSION, account_storage_key(username)).async_remove()
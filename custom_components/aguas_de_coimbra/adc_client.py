@@ -1,17 +1,43 @@
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import hashlib
+import json
 import logging
-from datetime import timedelta
+import random
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Iterator
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import date, datetime, timedelta
+from typing import Any, NamedTuple
 
-from aiohttp import ClientSession
+from aiohttp import ClientError, ClientSession, ClientTimeout
 from homeassistant.util import dt as dt_util
 
-from .const import BALCAO_DIGITAL_URL, VAT_RATE
-from .utils import (
-    calculate_water_consumption_cost,
-    calculate_water_fixed_fee_cost,
-    calculate_sewage_cost,
-    calculate_solid_waste_cost,
-    calculate_taxes_cost,
+from .const import (
+    BALCAO_DIGITAL_URL,
+    CIRCUIT_FAILURE_THRESHOLD,
+    CIRCUIT_RESET_TIMEOUT,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    METER_DETAILS_MAX_AGE,
+    METER_IDENTITY_TTL,
+    READING_DATE_KEYS,
+    REQUEST_ATTEMPTS,
+    REQUEST_BACKOFF,
+    REQUEST_TIMEOUT,
+    RESPONSE_CACHE_SIZE,
+    TOKEN_DEFAULT_LIFETIME,
+    TOKEN_MIN_REFRESH_DELAY,
+    TOKEN_REFRESH_MARGIN,
+    USAGE_FINAL_DELAY,
+    USAGE_MERGE_GAP_DAYS,
+    USAGE_WINDOW_DAYS,
 )
+from .history import AdCUsageHistory
+from .instrumentation import AdCClientStats
+from .tariff import get_tariff
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -28,7 +54,264 @@ class CannotConnect(Exception):
     pass
 
 
+class RequestTimeout(CannotConnect):
+    """Raised when the API does not answer in time."""
+
+    pass
+
+
+class DeadlineExceeded(CannotConnect):
+    """Raised when a refresh runs out of its time budget."""
+
+    pass
+
+
+class PortalUnavailable(CannotConnect):
+    """Raised while the circuit breaker keeps requests away from the API."""
+
+    pass
+
+
+class UnexpectedResponse(Exception):
+    """Raised when the API answers with an unexpected status code."""
+
+    def __init__(self, message: str, status: int) -> None:
+        super().__init__(f"{message} (status {status})")
+        self.status = status
+
+
+# Monotonic time by which the current refresh must be done, if any
+_deadline: ContextVar[float | None] = ContextVar("adc_deadline", default=None)
+
+
+class _CircuitBreaker:
+    """Stop calling the API during an outage.
+
+    After CIRCUIT_FAILURE_THRESHOLD consecutive transient failures the
+    circuit opens and requests fail straight away. Once CIRCUIT_RESET_TIMEOUT
+    has passed, a single probe request is let through (half-open): success
+    closes the circuit, failure opens it again.
+    """
+
+    def __init__(self) -> None:
+        self._failures = 0
+        self._opened_at: float | None = None
+        self._probing = False
+
+    def before_request(self) -> bool:
+        """Raise PortalUnavailable unless a request may be sent now.
+
+        Returns whether the request is the probe, which must be ended with
+        end_probe however it finishes.
+        """
+        if self._opened_at is None:
+            return False
+        if (
+            time.monotonic() - self._opened_at < CIRCUIT_RESET_TIMEOUT
+            or self._probing
+        ):
+            raise PortalUnavailable("Portal unavailable, not retrying yet")
+        self._probing = True
+        return True
+
+    def end_probe(self) -> None:
+        """Let another request probe if this one recorded no outcome.
+
+        A cancelled probe records neither success nor failure. The failures
+        that opened the circuit are still counted, so a failed probe opens it
+        again all the same.
+        """
+        self._probing = False
+
+    @property
+    def is_open(self) -> bool:
+        return self._opened_at is not None
+
+    def record_success(self) -> None:
+        if self._opened_at is not None:
+            _LOGGER.info("Portal is reachable again")
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        if self._probing or self._failures >= CIRCUIT_FAILURE_THRESHOLD:
+            if self._opened_at is None:
+                _LOGGER.warning("Portal seems down, pausing requests")
+            self._opened_at = time.monotonic()
+        self._probing = False
+
+
+class _CachedResponse(NamedTuple):
+    """A decoded portal answer and what identifies its body."""
+
+    etag: str | None
+    digest: bytes
+    data: Any
+
+
+def _expiration_timestamp(value: Any) -> float | None:
+    """Return a token expiration date as epoch seconds."""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        # The portal may send epoch milliseconds
+        return value / 1000 if value > 1e11 else float(value)
+    parsed = dt_util.parse_datetime(str(value))
+    return parsed.timestamp() if parsed else None
+
+
+class _TokenManager:
+    """Keep a valid portal token around.
+
+    Logins are single-flight. A timer replaces the token in the background
+    TOKEN_REFRESH_MARGIN before it expires, while it keeps being used, so
+    requests only wait for a login when there is no usable token at all.
+    """
+
+    def __init__(self, login: Callable[[], Awaitable[None]]) -> None:
+        self._login = login
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+        self._refresh_timer: asyncio.TimerHandle | None = None
+        self._warned_expiration = False
+        self.token: str | None = None
+        # Epoch seconds
+        self.expires_at: float | None = None
+
+    def set(self, token: str | None, expiration: Any) -> None:
+        self.token = token
+        self.expires_at = _expiration_timestamp(expiration)
+        if token and self.expires_at is None:
+            if not self._warned_expiration:
+                _LOGGER.warning(
+                    "Could not read the token expiration date %r, assuming "
+                    "the token lasts %s seconds",
+                    expiration,
+                    TOKEN_DEFAULT_LIFETIME,
+    TOKEN_MIN_REFRESH_DELAY,
+                )
+                self._warned_expiration = True
+            self.expires_at = dt_util.utcnow().timestamp() + TOKEN_DEFAULT_LIFETIME
+        self._schedule_refresh()
+
+    def _schedule_refresh(self) -> None:
+        """Start the background refresh TOKEN_REFRESH_MARGIN before expiry."""
+        self.cancel()
+        remaining = self._remaining()
+        if remaining <= 0:
+            return
+        self._refresh_later(remaining - TOKEN_REFRESH_MARGIN)
+
+    def _refresh_later(self, delay: float) -> None:
+        """Arm the refresh timer, at least TOKEN_MIN_REFRESH_DELAY from now.
+
+        The timer runs in a fresh context, so the refresh doesn't inherit the
+        deadline of whatever refresh logged in last.
+        """
+        self._refresh_timer = asyncio.get_running_loop().call_later(
+            max(delay, TOKEN_MIN_REFRESH_DELAY),
+            self._start_refresh,
+            context=contextvars.Context(),
+        )
+
+    def _start_refresh(self) -> None:
+        self._refresh_timer = None
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh())
+
+    def cancel(self) -> None:
+        """Stop the scheduled refresh."""
+        if self._refresh_timer is not None:
+            self._refresh_timer.cancel()
+            self._refresh_timer = None
+
+    def _remaining(self) -> float:
+        if not self.token or self.expires_at is None:
+            return 0
+        return self.expires_at - dt_util.utcnow().timestamp()
+
+    def is_valid(self) -> bool:
+        return self._remaining() > 0
+
+    def invalidate(self, token: str | None) -> None:
+        """Drop a token the portal rejected, unless it was already replaced."""
+        if token == self.token:
+            self.token = None
+
+    async def get(self) -> str:
+        """Return a valid token, logging in first if there is none."""
+        if not self.is_valid():
+            async with self._lock:
+                # Another call may have logged in while we waited for the lock
+                if not self.is_valid():
+                    _LOGGER.debug("Token expired, logging in again")
+                    await self._login()
+        return self.token
+
+    async def _refresh(self) -> None:
+        """Replace a token that is about to expire."""
+        async with self._lock:
+            # Another login may have replaced the token meanwhile
+            if self._remaining() > TOKEN_REFRESH_MARGIN + 1:
+                return
+            try:
+                await self._login()
+            except Exception as err:
+                # The current token may still be valid, try again a bit later
+                _LOGGER.debug("Failed to refresh token: %s", err)
+                if self._remaining() > TOKEN_MIN_REFRESH_DELAY:
+                    self._refresh_later(TOKEN_MIN_REFRESH_DELAY)
+
+
+def _reading_time(reading: dict) -> datetime | None:
+    """Return the local timestamp of a usage reading, if the portal sent one."""
+    for key in READING_DATE_KEYS:
+        value = reading.get(key)
+        if value is None:
+            continue
+        if isinstance(value, (int, float)):
+            # Epoch timestamps may come in milliseconds
+            if value > 1e11:
+                value = value / 1000
+            return dt_util.as_local(dt_util.utc_from_timestamp(value))
+        parsed = dt_util.parse_datetime(str(value))
+        if parsed is None:
+            parsed_date = dt_util.parse_date(str(value)[:10])
+            if parsed_date is None:
+                continue
+            parsed = dt_util.start_of_local_day(parsed_date)
+        return dt_util.as_local(parsed)
+    return None
+
+
+def _days_between(initial_day: date, final_day: date) -> list[date]:
+    """List every day from initial_day to final_day, both included."""
+    return [
+        initial_day + timedelta(days=offset)
+        for offset in range((final_day - initial_day).days + 1)
+    ]
+
+
+def plan_usage_ranges(days: list[date]) -> list[tuple[date, date]]:
+    """Merge the days needed in a refresh into the fewest usage queries.
+
+    Days closer than USAGE_MERGE_GAP_DAYS are fetched in the same request,
+    since a few extra rows are cheaper than another round trip.
+    """
+    ranges: list[tuple[date, date]] = []
+    for day in sorted(set(days)):
+        if ranges and (day - ranges[-1][1]).days <= USAGE_MERGE_GAP_DAYS + 1:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
 class AdCClient:
+    """Account level access to the portal, shared by all its meters."""
+
     def __init__(
         self,
         username: str,
@@ -36,168 +319,779 @@ class AdCClient:
         billing_cycle_start_day: int,
         social_tariff: bool,
         session: ClientSession,
+        max_concurrent_requests: int = DEFAULT_MAX_CONCURRENT_REQUESTS,
+        base_url: str = BALCAO_DIGITAL_URL,
     ):
         self._username = username
         self._password = password
-        self._billing_cycle_start_day = billing_cycle_start_day
-        self._social_tariff = social_tariff
-        self._codigo_marca = None
-        self._codigo_produto = None
-        self._subscription_id = None
-        self._numero_contador = None
-        self._diameter = None
-        self._token = None
-        self._token_expiration_date = None
+        self.billing_cycle_start_day = billing_cycle_start_day
+        self.social_tariff = social_tariff
+        self._subscription_ids: list[str] = []
+        # When the subscriptions and their meters were last discovered
+        self._meters_updated: datetime | None = None
         self._session = session
+        # Another portal, such as the mock server of the benchmarks
+        self._base_url = base_url
+        self._tokens = _TokenManager(self.login)
+        # Number of logins since startup
+        self.login_count = 0
+
+        # Every meter of every subscription, keyed by meter ID
+        self.meters: dict[str, AdCMeter] = {}
+
+        # Parallel calls share a single meter discovery
+        self._discovery_lock = asyncio.Lock()
+        self._meter_details_tasks: dict[str, asyncio.Task] = {}
+        # Bounds the portal requests in flight across all meters
+        self._request_semaphore = asyncio.Semaphore(max_concurrent_requests)
+        self._circuit_breaker = _CircuitBreaker()
+        # Per-endpoint request counters, latencies and cache hits
+        self.stats = AdCClientStats()
+        # Last answers of the requests that are polled repeatedly
+        self._responses: dict[str, _CachedResponse] = {}
+        self._warned_no_timestamp = False
+
+    def _warn_no_timestamp(self, reading: dict) -> None:
+        """Warn once that readings can't be split by hour or by day."""
+        if self._warned_no_timestamp:
+            return
+        _LOGGER.warning(
+            "Usage readings have no timestamp in any of %s (keys %s), fetching "
+            "one day per request and booking every reading at midnight",
+            READING_DATE_KEYS,
+            sorted(reading),
+        )
+        self._warned_no_timestamp = True
+
+    def shutdown(self) -> None:
+        """Stop the background token refresh."""
+        self._tokens.cancel()
+
+    def export_state(self) -> dict:
+        """Return the state worth keeping across restarts."""
+        return {
+            "token": self._tokens.token,
+            "token_expiration_date": self._tokens.expires_at,
+            "subscription_ids": self._subscription_ids,
+            "meters_updated": self._meters_updated.isoformat()
+            if self._meters_updated
+            else None,
+            "meters": {
+                meter_id: meter.export_state()
+                for meter_id, meter in self.meters.items()
+            },
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the state saved by export_state."""
+        self._tokens.set(state.get("token"), state.get("token_expiration_date"))
+        self._subscription_ids = state.get("subscription_ids", [])
+        if state.get("meters_updated"):
+            self._meters_updated = dt_util.parse_datetime(state["meters_updated"])
+
+        meters = state.get("meters", {})
+        if state.get("subscription_id"):
+            # Single meter layout saved before multiple meters were supported
+            meters = {f"{state['subscription_id']}_0": state}
+            self._subscription_ids = [state["subscription_id"]]
+
+        for meter_id, meter_state in meters.items():
+            meter = AdCMeter(
+                self,
+                meter_id,
+                meter_state["subscription_id"],
+                meter_state.get("index", 0),
+            )
+            meter.restore_state(meter_state)
+            self.meters[meter_id] = meter
+
+    def diagnostics(self) -> dict:
+        """Return the request instrumentation and connection state."""
+        return {
+            "login_count": self.login_count,
+            "token_expires_at": self._tokens.expires_at,
+            "circuit_open": self._circuit_breaker.is_open,
+            "cached_responses": len(self._responses),
+            **self.stats.as_dict(),
+        }
+
+    @contextmanager
+    def deadline(self, seconds: float) -> Iterator[None]:
+        """Give every request made inside this block a shared time budget."""
+        token = _deadline.set(time.monotonic() + seconds)
+        try:
+            yield
+        finally:
+            _deadline.reset(token)
+
+    async def _request(
+        self,
+        method: str,
+        path: str,
+        error_message: str,
+        authenticated: bool = True,
+        **kwargs: Any,
+    ) -> Any:
+        """Send a request to the portal and return the decoded JSON answer."""
+        data, _ = await self._call(method, path, error_message, authenticated, **kwargs)
+        return data
+
+    async def _request_cached(
+        self, cache_key: str, method: str, path: str, error_message: str, **kwargs: Any
+    ) -> tuple[Any, bool]:
+        """Send a request whose answer is remembered under cache_key.
+
+        Returns the decoded answer and whether it changed since the last
+        request with the same key. Unchanged answers are not decoded again.
+        """
+        return await self._call(
+            method, path, error_message, True, cache_key=cache_key, **kwargs
+        )
+
+    async def _call(
+        self,
+        method: str,
+        path: str,
+        error_message: str,
+        authenticated: bool,
+        **kwargs: Any,
+    ) -> tuple[Any, bool]:
+        """Send a request, logging in when needed.
+
+        A token rejected before its expiry is replaced once and the request
+        sent again.
+        """
+        if not authenticated:
+            return await self._send(method, path, error_message, **kwargs)
+
+        token = await self._tokens.get()
+        try:
+            return await self._send(
+                method, path, error_message, headers=self._headers(token), **kwargs
+            )
+        except InvalidAuth:
+            _LOGGER.debug("Token rejected, logging in again")
+            self._tokens.invalidate(token)
+            token = await self._tokens.get()
+            return await self._send(
+                method, path, error_message, headers=self._headers(token), **kwargs
+            )
+
+    async def _send(
+        self,
+        method: str,
+        path: str,
+        error_message: str,
+        cache_key: str | None = None,
+        **kwargs: Any,
+    ) -> tuple[Any, bool]:
+        """Send a request, retrying transient failures.
+
+        Timeouts, connection errors and 5xx answers are retried with
+        exponential backoff and jitter, within the refresh deadline and
+        unless the circuit breaker is open. Every attempt is recorded in
+        the stats of its endpoint.
+        """
+        url = f"{self._base_url}uPortal2/coimbra/{path}"
+        cached = self._responses.get(cache_key) if cache_key else None
+        if cached is not None and cached.etag:
+            kwargs["headers"] = {**kwargs["headers"], "If-None-Match": cached.etag}
+
+        for attempt in range(REQUEST_ATTEMPTS):
+            try:
+                return await self._send_once(
+                    method, url, path, error_message, cache_key, cached, **kwargs
+                )
+            except (asyncio.TimeoutError, ClientError, CannotConnect) as err:
+                if isinstance(err, asyncio.TimeoutError):
+                    error: Exception = RequestTimeout(f"{error_message}: timed out")
+                elif isinstance(err, ClientError):
+                    error = CannotConnect(f"{error_message}: {err}")
+                elif isinstance(err, (DeadlineExceeded, PortalUnavailable)):
+                    self.stats.record_error(path, err)
+                    raise
+                else:
+                    error = err
+            except (InvalidAuth, UnexpectedResponse) as err:
+                self.stats.record_error(path, err)
+                raise
+
+            self.stats.record_error(path, error)
+            self._circuit_breaker.record_failure()
+            if attempt == REQUEST_ATTEMPTS - 1:
+                _LOGGER.error("%s: %s", error_message, error)
+                raise error
+
+            # Full jitter keeps parallel retries from hitting the portal together
+            delay = random.uniform(0, REQUEST_BACKOFF * 2**attempt)
+            deadline = _deadline.get()
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise DeadlineExceeded(f"{error_message}: out of time") from error
+            _LOGGER.debug("%s, retrying in %.1fs: %s", error_message, delay, error)
+            await asyncio.sleep(delay)
+
+    async def _send_once(
+        self,
+        method: str,
+        url: str,
+        path: str,
+        error_message: str,
+        cache_key: str | None,
+        cached: _CachedResponse | None,
+        **kwargs: Any,
+    ) -> tuple[Any, bool]:
+        """Send a single attempt of a request.
+
+        Transient failures are raised as CannotConnect or by aiohttp.
+        """
+        timeout = REQUEST_TIMEOUT
+        deadline = _deadline.get()
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                raise DeadlineExceeded(f"{error_message}: out of time")
+        probe = self._circuit_breaker.before_request()
+        try:
+            start = time.monotonic()
+            async with self._request_semaphore, self._session.request(
+                method, url, timeout=ClientTimeout(total=timeout), **kwargs
+            ) as resp:
+                body = await resp.read()
+                self.stats.record_call(path, time.monotonic() - start, len(body))
+                if resp.status < 500:
+                    # The portal answered, even if with an error
+                    self._circuit_breaker.record_success()
+                if resp.status == 304 and cached is not None:
+                    self.stats.record_cache(path, True)
+                    return cached.data, False
+                if resp.status == 401:
+                    raise InvalidAuth(f"{error_message}: unauthorized")
+                if 400 <= resp.status < 500:
+                    _LOGGER.error("%s. Status code: %s", error_message, resp.status)
+                    raise UnexpectedResponse(error_message, resp.status)
+                if resp.status != 200:
+                    raise CannotConnect(f"{error_message} (status {resp.status})")
+                try:
+                    if cache_key is None:
+                        return json.loads(body), True
+                    data, changed = self._cache_response(
+                        cache_key, resp.headers.get("ETag"), body
+                    )
+                except ValueError as err:
+                    # Such as an HTML maintenance page
+                    raise CannotConnect(f"{error_message}: invalid answer") from err
+                self.stats.record_cache(path, not changed)
+                return data, changed
+        finally:
+            if probe:
+                self._circuit_breaker.end_probe()
+
+    def _cache_response(
+        self, cache_key: str, etag: str | None, body: bytes
+    ) -> tuple[Any, bool]:
+        """Decode a response body unless it matches the cached one."""
+        digest = hashlib.blake2b(body, digest_size=16).digest()
+        cached = self._responses.pop(cache_key, None)
+        changed = cached is None or cached.digest != digest
+        if changed:
+            cached = _CachedResponse(etag, digest, json.loads(body))
+        # Most recently used last, the oldest entries are dropped first
+        self._responses[cache_key] = cached
+        while len(self._responses) > RESPONSE_CACHE_SIZE:
+            del self._responses[next(iter(self._responses))]
+        return cached.data, changed
 
     async def login(self):
         """Login to the Aguas de Coimbra portal."""
-        login_url = f"{BALCAO_DIGITAL_URL}uPortal2/coimbra/login"
         payload = {
             "username": self._username,
             "password": self._password,
         }
 
-        async with self._session.post(login_url, json=payload) as resp:
-            if resp.status == 401:
-                _LOGGER.error("Invalid username or password")
-                raise InvalidAuth("Invalid username or password")
-            elif resp.status != 200:
-                _LOGGER.error("Failed to connect to the API. Status code: %s", resp.status)
-                raise CannotConnect("Failed to connect to the API")
-
-            data = await resp.json()
-            token = data.get("token")
-            self._token = token["token"]
-            self._token_expiration_date = token["expirationDate"]
-
-    def _is_token_valid(self):
-        """Check if the token is still valid."""
-        if self._token and self._token_expiration_date:
-            return dt_util.now().timestamp() < self._token_expiration_date
-        return False
-
-    async def _headers(self) -> dict:
-        """Set headers for subsequent requests."""
-        if not self._is_token_valid():
-            _LOGGER.debug("Token expired, logging in again")
-            await self.login()
+        try:
+            data = await self._request(
+                "post",
+                "login",
+                "Failed to connect to the API",
+                authenticated=False,
+                json=payload,
+            )
+        except InvalidAuth as err:
+            _LOGGER.error("Invalid username or password")
+            raise InvalidAuth("Invalid username or password") from err
+        except UnexpectedResponse as err:
+            raise CannotConnect("Failed to connect to the API") from err
+
+        token = data.get("token")
+        self._tokens.set(token["token"], token["expirationDate"])
+        self.login_count += 1
 
+    @staticmethod
+    def _headers(token: str) -> dict:
+        """Set headers for subsequent requests."""
         return {
-            "X-Auth-Token": self._token,
+            "X-Auth-Token": token,
             "Content-Type": "application/json",
         }
 
-    async def get_subscription_id(self) -> list:
-        """Fetch account subscription ID"""
+    async def get_subscription_ids(self) -> list[str]:
+        """Fetch every subscription ID of the account"""
 
-        subscription_url = (
-            f"{BALCAO_DIGITAL_URL}uPortal2/coimbra/Subscription/listSubscriptions"
+        data = await self._request(
+            "get",
+            "Subscription/listSubscriptions",
+            "Failed to fetch subscription ID",
         )
+        self._subscription_ids = [
+            subscription["subscriptionId"] for subscription in data
+        ]
+        return self._subscription_ids
 
-        headers = await self._headers()
-        async with self._session.get(subscription_url, headers=headers) as resp:
-            if resp.status != 200:
-                _LOGGER.error("Failed to fetch subscription ID. Status code: %s", resp.status)
-                raise Exception("Failed to fetch subscription ID")
+    async def discover_meters(self) -> dict[str, AdCMeter]:
+        """Discover the meters of every subscription.
 
-            data = await resp.json()
-            self._subscription_id = data[0]["subscriptionId"]
+        Runs at most once per METER_IDENTITY_TTL, querying the subscriptions
+        in parallel within the request limit.
+        """
+        async with self._discovery_lock:
+            if (
+                self.meters
+                and self._meters_updated is not None
+                and dt_util.now() - self._meters_updated < METER_IDENTITY_TTL
+            ):
+                return self.meters
 
-    async def get_meter_details(self) -> dict:
-        """Fetch meter details using subscription ID"""
+            await self.get_subscription_ids()
+            await asyncio.gather(
+                *(
+                    self.get_meter_details(subscription_id)
+                    for subscription_id in self._subscription_ids
+                )
+            )
+            self._meters_updated = dt_util.now()
+            return self.meters
 
-        details_url = f"{BALCAO_DIGITAL_URL}uPortal2/coimbra/leituras/getContadores"
+    async def get_meter_details(self, subscription_id: str) -> list:
+        """Fetch the details of the meters of a subscription"""
 
-        if not self._subscription_id:
-            await self.get_subscription_id()
+        # Parallel callers wait for the same getContadores request
+        task = self._meter_details_tasks.get(subscription_id)
+        if task is None or task.done():
+            task = asyncio.create_task(self._fetch_meter_details(subscription_id))
+            self._meter_details_tasks[subscription_id] = task
+        return await asyncio.shield(task)
 
-        query_params = {"subscriptionId": self._subscription_id}
-        headers = await self._headers()
-        async with self._session.get(
-            details_url, headers=headers, params=query_params
-        ) as resp:
-            if resp.status != 200:
-                _LOGGER.error("Failed to fetch meter details. Status code: %s", resp.status)
-                # revoke token if it fails
-                self._token = None
-                raise Exception("Failed to fetch meter details")
+    async def _fetch_meter_details(self, subscription_id: str) -> list:
+        """Fetch meter details from the portal"""
 
-            data = await resp.json()
-            self._codigo_marca = data[0]["chaveContador"]["codigoMarca"]
-            self._codigo_produto = data[0]["chaveContador"]["codigoProduto"]
-            self._numero_contador = data[0]["chaveContador"]["numeroContador"]
+        data, changed = await self._request_cached(
+            f"meters:{subscription_id}",
+            "get",
+            "leituras/getContadores",
+            "Failed to fetch meter details",
+            params={"subscriptionId": subscription_id},
+        )
 
-            try:
-                diameter = data[0]["descModelo"]
-                diameter = diameter.split("/")[1].strip()
-                diameter = int(diameter)
-            except (IndexError, ValueError):
-                _LOGGER.warning(
-                    "Could not parse diameter from model description, using default value (15mm)"
+        for index, details in enumerate(data):
+            meter_id = f"{subscription_id}_{index}"
+            if meter_id not in self.meters:
+                self.meters[meter_id] = AdCMeter(self, meter_id, subscription_id, index)
+            if changed:
+                self.meters[meter_id].update_details(details)
+            else:
+                self.meters[meter_id].mark_details_current()
+        return data
+
+    async def _get_usage(
+        self,
+        meter: AdCMeter,
+        initial_day: str,
+        final_day: str = None,
+        cache: bool = True,
+    ) -> tuple[list, bool]:
+        """Fetch water usage of a meter for a range of days.
+
+        Returns the readings and whether they changed since the same range
+        was last fetched. Uncached requests always count as changed.
+        """
+
+        if not meter.has_identity():
+            await self.get_meter_details(meter.subscription_id)
+
+        query_params = {
+            "codigoMarca": meter.codigo_marca,
+            "codigoProduto": meter.codigo_produto,
+            "subscriptionId": meter.subscription_id,
+            "numeroContador": meter.numero_contador,
+            "initialDate": initial_day,
+            "finalDate": final_day if final_day else initial_day,
+        }
+
+        try:
+            if not cache:
+                data = await self._request(
+                    "get",
+                    "History/consumo/carga",
+                    "Failed to fetch usage data",
+                    params=query_params,
                 )
-                # If the diameter cannot be parsed, set a default value
-                diameter = 15
-            self._diameter = diameter
-            return data
+                return data, True
+            return await self._request_cached(
+                f"usage:{meter.meter_id}:{query_params['initialDate']}:"
+                f"{query_params['finalDate']}",
+                "get",
+                "History/consumo/carga",
+                "Failed to fetch usage data",
+                params=query_params,
+            )
+        except UnexpectedResponse:
+            # The meter may have been swapped, discover it again
+            meter.identity_updated = None
+            raise
+
+    async def iter_usage(
+        self, meter: AdCMeter, initial_day: date, final_day: date
+    ) -> AsyncIterator[tuple[datetime, float]]:
+        """Yield the (timestamp, litres) readings of a meter for a range of days.
+
+        The range is fetched in windows of USAGE_WINDOW_DAYS, so only one
+        window of readings is held in memory however long the range is.
+        Readings without a timestamp are dated at the start of their day.
+        """
+        window_start = initial_day
+        while window_start <= final_day:
+            window_end = min(
+                window_start + timedelta(days=USAGE_WINDOW_DAYS - 1), final_day
+            )
+            async for reading in self._iter_usage_window(
+                meter, window_start, window_end
+            ):
+                yield reading
+            window_start = window_end + timedelta(days=1)
+
+    async def _iter_usage_window(
+        self, meter: AdCMeter, initial_day: date, final_day: date
+    ) -> AsyncIterator[tuple[datetime, float]]:
+        """Yield the readings of a single window."""
+        data, _ = await self._get_usage(
+            meter,
+            initial_day=initial_day.strftime("%Y-%m-%d"),
+            final_day=final_day.strftime("%Y-%m-%d"),
+            cache=False,
+        )
+        # Keep only the two values of each row, not the decoded dicts
+        readings = [(_reading_time(row), row["consumption"]) for row in data]
+        untimed = next(
+            (row for row, (time, _) in zip(data, readings) if time is None), None
+        )
+        del data
+        if untimed is not None:
+            self._warn_no_timestamp(untimed)
+        if initial_day != final_day and untimed is not None:
+            # Rows can't be split by day, fall back to one request per day
+            for day in _days_between(initial_day, final_day):
+                async for reading in self._iter_usage_window(meter, day, day):
+                    yield reading
+            return
+
+        start_of_day = dt_util.start_of_local_day(initial_day)
+        for reading_time, consumption in readings:
+            yield reading_time or start_of_day, consumption
+
+
+class AdCMeter:
+    """A single water meter, with its own usage history and billing cycle."""
+
+    def __init__(
+        self, client: AdCClient, meter_id: str, subscription_id: str, index: int
+    ):
+        self._client = client
+        self.meter_id = meter_id
+        self.subscription_id = subscription_id
+        # Position of the meter in the getContadores list of its subscription
+        self.index = index
+        self.codigo_marca = None
+        self.codigo_produto = None
+        self.numero_contador = None
+        self.diameter = None
+        # When the meter identity above was last read from getContadores
+        self.identity_updated: datetime | None = None
+        # Last getContadores entry, reused by get_last_meter_reading
+        self._details: dict | None = None
+        self._details_updated: datetime | None = None
+
+        # Hourly litres consumed, read by every sensor and cost calculation.
+        # Final days are never fetched again
+        self.history = AdCUsageHistory(client.billing_cycle_start_day)
+        # Timestamp of the newest hourly reading seen so far
+        self.newest_reading: datetime | None = None
+        # Fetch in progress for each day, shared by the tiers asking for it
+        self._inflight: dict[date, asyncio.Task] = {}
+
+    def export_state(self) -> dict:
+        """Return the state worth keeping across restarts."""
+        return {
+            "subscription_id": self.subscription_id,
+            "index": self.index,
+            "codigo_marca": self.codigo_marca,
+            "codigo_produto": self.codigo_produto,
+            "numero_contador": self.numero_contador,
+            "diameter": self.diameter,
+            "meter_identity_updated": self.identity_updated.isoformat()
+            if self.identity_updated
+            else None,
+            "usage": {
+                day.isoformat(): {
+                    "total": self.history.day_total(day),
+                    "hours": self.history.hours(day),
+                    "final": final,
+                }
+                for day, final in self.history.days()
+            },
+            "usage_months": {
+                month.isoformat(): [litres, mask]
+                for month, litres, mask in self.history.months()
+            },
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the state saved by export_state."""
+        self.codigo_marca = state.get("codigo_marca")
+        self.codigo_produto = state.get("codigo_produto")
+        self.numero_contador = state.get("numero_contador")
+        self.diameter = state.get("diameter")
+        if state.get("meter_identity_updated"):
+            self.identity_updated = dt_util.parse_datetime(
+                state["meter_identity_updated"]
+            )
+
+        for day_str, usage in state.get("usage", {}).items():
+            day = dt_util.parse_date(day_str)
+            if day is None:
+                continue
+            self.history.set_day(day, usage["total"], usage["hours"], usage["final"])
+        for month_str, (litres, mask) in state.get("usage_months", {}).items():
+            # Calendar months were saved as YYYY-MM
+            if len(month_str) == 7:
+                month_str = f"{month_str}-01"
+            month = dt_util.parse_date(month_str)
+            if month is not None:
+                self.history.set_month(month, litres, mask)
+
+    def update_details(self, details: dict) -> None:
+        """Store a getContadores entry, parsing the identity only on a meter swap."""
+        self._details = details
+        self._details_updated = self.identity_updated = dt_util.now()
+        numero_contador = details["chaveContador"]["numeroContador"]
+        if self.diameter is not None and numero_contador == self.numero_contador:
+            return
+        if self.numero_contador is not None:
+            _LOGGER.info(
+                "Meter changed from %s to %s", self.numero_contador, numero_contador
+            )
+
+        self.codigo_marca = details["chaveContador"]["codigoMarca"]
+        self.codigo_produto = details["chaveContador"]["codigoProduto"]
+        self.numero_contador = numero_contador
+
+        try:
+            diameter = details["descModelo"]
+            diameter = diameter.split("/")[1].strip()
+            diameter = int(diameter)
+        except (IndexError, ValueError):
+            _LOGGER.warning(
+                "Could not parse diameter from model description, using default value (15mm)"
+            )
+            # If the diameter cannot be parsed, set a default value
+            diameter = 15
+        self.diameter = diameter
+
+    def mark_details_current(self) -> None:
+        """Record that getContadores answered the same as last time."""
+        self._details_updated = self.identity_updated = dt_util.now()
+
+    def has_identity(self) -> bool:
+        """Check if the cached meter identity can be used for usage queries."""
+        return (
+            bool(self.codigo_marca and self.codigo_produto and self.numero_contador)
+            and self.identity_updated is not None
+            and dt_util.now() - self.identity_updated < METER_IDENTITY_TTL
+        )
 
     async def get_last_meter_reading(self) -> float:
         """Fetch latest meter reading"""
-        details = await self.get_meter_details()
-        return details[0]["ultimaLeitura"]["leituras"][0]["leitura"]
+        # Reuse a getContadores response fetched moments ago by meter discovery
+        if (
+            self._details is None
+            or self._details_updated is None
+            or dt_util.now() - self._details_updated >= METER_DETAILS_MAX_AGE
+        ):
+            await self._client.get_meter_details(self.subscription_id)
+        return self._details["ultimaLeitura"]["leituras"][0]["leitura"]
 
-    async def _get_usage(self, initial_day: str, final_day: str = None) -> dict:
-        """Fetch water usage for a specific day"""
+    def _is_day_final(self, day: date) -> bool:
+        """Check if the portal is done revising the readings of a day."""
+        end_of_day = dt_util.start_of_local_day(day + timedelta(days=1))
+        return dt_util.now() >= end_of_day + USAGE_FINAL_DELAY
 
-        usage_url = f"{BALCAO_DIGITAL_URL}uPortal2/coimbra/History/consumo/carga"
+    def _store_usage(self, day: date, consumption: float, hours: list[float]) -> None:
+        """Cache the consumption of a day, marking it final when applicable."""
+        if self.history.is_final(day):
+            return
+        self.history.set_day(day, consumption, hours, self._is_day_final(day))
 
-        if not self._subscription_id:
-            await self.get_subscription_id()
-        if (
-            not self._codigo_marca
-            or not self._codigo_produto
-            or not self._numero_contador
+    async def _fetch_usage_days(self, initial_day: date, final_day: date) -> None:
+        """Fetch a range of days in one request and cache the totals per day."""
+        days = _days_between(initial_day, final_day)
+        if len(days) > USAGE_WINDOW_DAYS:
+            await self._stream_usage_days(days)
+            return
+
+        data, changed = await self._client._get_usage(
+            self,
+            initial_day=initial_day.strftime("%Y-%m-%d"),
+            final_day=final_day.strftime("%Y-%m-%d"),
+            # Ranges of final days are never asked for again, don't keep them
+            cache=not self._is_day_final(final_day),
+        )
+
+        if not changed and all(self.history.has_day(day) for day in days):
+            # Same readings as last time, only days may have become final
+            for day in days:
+                if self._is_day_final(day):
+                    self.history.mark_final(day)
+            return
+
+        totals = {day: 0 for day in days}
+        hours = {day: [0] * 24 for day in totals}
+        for reading in data:
+            consumption = reading["consumption"]
+            reading_time = _reading_time(reading)
+            if reading_time is None:
+                self._client._warn_no_timestamp(reading)
+            elif self.newest_reading is None or reading_time > self.newest_reading:
+                self.newest_reading = reading_time
+            if initial_day == final_day:
+                totals[initial_day] += consumption
+                if reading_time is not None:
+                    hours[initial_day][reading_time.hour] += consumption
+                continue
+
+            if reading_time is None:
+                # Rows can't be split by day, fall back to one request per day
+                for day in totals:
+                    await self._fetch_usage_days(day, day)
+                return
+            if reading_time.date() in totals:
+                totals[reading_time.date()] += consumption
+                hours[reading_time.date()][reading_time.hour] += consumption
+
+        for day, consumption in totals.items():
+            self._store_usage(day, consumption, hours[day])
+
+    async def _stream_usage_days(self, days: list[date]) -> None:
+        """Fetch a long range of days one window at a time and cache the totals."""
+        totals = {day: 0 for day in days}
+        hours = {day: [0] * 24 for day in totals}
+        async for reading_time, consumption in self._client.iter_usage(
+            self, days[0], days[-1]
         ):
-            await self.get_meter_details()
+            day = reading_time.date()
+            if day in totals:
+                totals[day] += consumption
+                hours[day][reading_time.hour] += consumption
 
-        query_params = {
-            "codigoMarca": self._codigo_marca,
-            "codigoProduto": self._codigo_produto,
-            "subscriptionId": self._subscription_id,
-            "numeroContador": self._numero_contador,
-            "initialDate": initial_day,
-            "finalDate": final_day if final_day else initial_day,
-        }
+        for day, consumption in totals.items():
+            self._store_usage(day, consumption, hours[day])
 
-        headers = await self._headers()
-        async with self._session.get(
-            usage_url, headers=headers, params=query_params
-        ) as resp:
-            if resp.status != 200:
-                _LOGGER.error("Failed to fetch usage data. Status code: %s", resp.status)
-                raise Exception("Failed to fetch usage data")
+    async def _ensure_usage(self, days: list[date], refresh_open: bool) -> None:
+        """Fetch the requested days that are missing or, optionally, still open.
 
-            data = await resp.json()
-            return data
+        All the days are planned together so overlapping queries cost a
+        single request. Days another tier is already fetching are awaited
+        instead of fetched again.
+        """
+        pending = [
+            day
+            for day in days
+            if not self.history.has_day(day)
+            or (refresh_open and not self.history.is_final(day))
+        ]
+        waiting = {self._inflight[day] for day in pending if day in self._inflight}
+        tasks = []
+        for initial_day, final_day in plan_usage_ranges(
+            [day for day in pending if day not in self._inflight]
+        ):
+            task = asyncio.ensure_future(
+                self._fetch_usage_days(initial_day, final_day)
+            )
+            range_days = _days_between(initial_day, final_day)
+            for day in range_days:
+                self._inflight.setdefault(day, task)
+            task.add_done_callback(
+                lambda task, range_days=range_days: self._fetch_done(
+                    task, range_days
+                )
+            )
+            tasks.append(task)
+        await asyncio.gather(*tasks, *waiting)
+
+    def _fetch_done(self, task: asyncio.Task, days: list[date]) -> None:
+        """Forget a finished fetch of a range of days."""
+        for day in days:
+            if self._inflight.get(day) is task:
+                del self._inflight[day]
+
+    async def load_usage(
+        self, initial_day: date, final_day: date, refresh_open: bool = False
+    ) -> float:
+        """Make sure a range of days is cached and return its total in litres.
+
+        With refresh_open, days fetched before they became final are fetched
+        again.
+        """
+        await self._ensure_usage(
+            _days_between(initial_day, final_day), refresh_open=refresh_open
+        )
+        return self.history.total(initial_day, final_day)
+
+    def get_final_usage_hours(self, day: date) -> list[float] | None:
+        """Get the hourly litres of a final day, or None if it may still change."""
+        if not self.history.is_final(day):
+            return None
+        return self.history.hours(day)
+
+    async def update_usage(self, today_only: bool = False) -> None:
+        """Refresh every open day needed by the sensors in as few requests as possible."""
+        if today_only:
+            # Yesterday too while it is still open, its last hours are only
+            # published after midnight and the leak detector reads them
+            today = dt_util.now().date()
+            await self._ensure_usage(
+                [today - timedelta(days=1), today], refresh_open=True
+            )
+            return
+
+        initial_day, final_day = self._get_billing_cycle_range()
+        days = _days_between(initial_day, final_day)
+        days.append(final_day - timedelta(days=1))
+        await self._ensure_usage(days, refresh_open=True)
 
     async def get_consumption_day(self, today: bool = True) -> float:
         """Get water usage for a day. Today or yesterday"""
 
-        day = dt_util.now()
+        day = dt_util.now().date()
         if not today:
             day = day - timedelta(days=1)
 
-        data = await self._get_usage(initial_day=day.strftime("%Y-%m-%d"))
-
-        consumption = 0
-        for reading in data:
-            consumption += reading["consumption"]
-        return consumption
+        await self._ensure_usage([day], refresh_open=False)
+        return self.history.day_total(day)
 
     def _get_billing_cycle_dates(self) -> tuple:
         """Get the start and end dates of the current billing cycle"""
         now = dt_util.now()
-        if now.day < self._billing_cycle_start_day:
+        start_day = self._client.billing_cycle_start_day
+        if now.day < start_day:
             # If today is before the billing cycle start, use last month
             month = now.month - 1 if now.month > 1 else 12
             year = now.year if month != 12 else now.year - 1
@@ -205,19 +1099,35 @@ class AdCClient:
             month = now.month
             year = now.year
 
-        initial_day = f"{year}-{month:02d}-{self._billing_cycle_start_day:02d}"
+        initial_day = f"{year}-{month:02d}-{start_day:02d}"
         final_day = now.strftime("%Y-%m-%d")
         return initial_day, final_day
 
+    def _get_billing_cycle_range(self) -> tuple[date, date]:
+        """Get the billing cycle dates as date objects"""
+        initial_day, final_day = (
+            dt_util.parse_date(day) for day in self._get_billing_cycle_dates()
+        )
+        return initial_day, final_day
+
+    def get_billing_cycle_end(self) -> date:
+        """Get the last day of the current billing cycle"""
+        initial_day, _ = self._get_billing_cycle_range()
+        if initial_day.month == 12:
+            next_start = initial_day.replace(year=initial_day.year + 1, month=1)
+        else:
+            next_start = initial_day.replace(month=initial_day.month + 1)
+        return next_start - timedelta(days=1)
+
     async def get_consumption_billing_cycle(self) -> float:
         """Get water usage for the current billing cycle"""
 
-        initial_day, final_day = self._get_billing_cycle_dates()
-        data = await self._get_usage(initial_day=initial_day, final_day=final_day)
+        initial_day, final_day = self._get_billing_cycle_range()
+        await self._ensure_usage(
+            _days_between(initial_day, final_day), refresh_open=False
+        )
 
-        consumption = 0
-        for reading in data:
-            consumption += reading["consumption"]
+        consumption = self.history.total(initial_day, final_day)
         return round(consumption / 1000, 2)  # Convert liters to cubic meters
 
     def calculate_cost(self, billing_cycle_consumption: float) -> float:
@@ -230,34 +1140,12 @@ class AdCClient:
 
         consumption_m3 = int(billing_cycle_consumption)
 
-        water_consumption_cost = calculate_water_consumption_cost(
-            consumption_m3=consumption_m3, social_tariff=self._social_tariff
-        )
-        water_fixed_fee_cost = calculate_water_fixed_fee_cost(
-            days_in_cycle=days_in_cycle,
-            social_tariff=self._social_tariff,
-            diameter=self._diameter,
-        )
-        sewage_cost = calculate_sewage_cost(
-            water_cost=water_consumption_cost,
-            days_in_cycle=days_in_cycle,
-            social_tariff=self._social_tariff,
-        )
-        solid_waste_cost = calculate_solid_waste_cost(
+        # Priced at the tariff in force when the cycle started
+        tariff = get_tariff(dt_util.parse_date(initial_day))
+        total_cost = tariff.total_cost(
             consumption_m3=consumption_m3,
             days_in_cycle=days_in_cycle,
-            social_tariff=self._social_tariff,
-        )
-        taxes_cost = calculate_taxes_cost(
-            consumption_m3=consumption_m3, days_in_cycle=days_in_cycle
-        )
-
-        # Add VAT
-        total_cost = (
-            water_consumption_cost * (1 + VAT_RATE)
-            + water_fixed_fee_cost * (1 + VAT_RATE)
-            + sewage_cost * (1 + VAT_RATE)
-            + solid_waste_cost  # Solid waste is exempt from VAT
-            + taxes_cost * (1 + VAT_RATE)
+            diameter=self.diameter,
+            social_tariff=self._client.social_tariff,
         )
         return round(total_cost, 2)
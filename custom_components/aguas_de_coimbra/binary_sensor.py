@@ -0,0 +1,91 @@
+from homeassistant.components.binary_sensor import (
+    BinarySensorDeviceClass,
+    BinarySensorEntity,
+)
+from homeassistant.core import callback
+from homeassistant.helpers.device_registry import DeviceInfo
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .adc_client import AdCMeter
+from .const import DOMAIN, TIER_FAST
+from .coordinator import AdCCoordinator, AdCTierCoordinator
+
+
+async def async_setup_entry(hass, entry, async_add_entities):
+    """Set up ADC leak sensors based on a config entry."""
+    coordinator: AdCCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    added_meters: set[str] = set()
+
+    @callback
+    def async_add_meter_sensors() -> None:
+        """Add a leak sensor for every meter not seen before."""
+        sensors = []
+        for meter_id, meter in coordinator.client.meters.items():
+            if meter_id in added_meters:
+                continue
+            added_meters.add(meter_id)
+            sensors.append(
+                ADCLeakSensor(
+                    coordinator.tiers[TIER_FAST],
+                    meter,
+                    coordinator.unique_id_prefix(entry.entry_id, meter_id),
+                    meter_id == coordinator.primary_meter_id,
+                )
+            )
+        if sensors:
+            async_add_entities(sensors)
+
+    async_add_meter_sensors()
+    entry.async_on_unload(
+        coordinator.tiers[TIER_FAST].async_add_listener(async_add_meter_sensors)
+    )
+
+
+class ADCLeakSensor(CoordinatorEntity, BinarySensorEntity):
+    """Leak or continuous flow on one Águas de Coimbra meter."""
+
+    def __init__(
+        self,
+        coordinator: AdCTierCoordinator,
+        meter: AdCMeter,
+        unique_id_prefix: str,
+        primary: bool,
+    ):
+        super().__init__(coordinator)
+        self.meter_id = meter.meter_id
+        self._attr_name = "Leak"
+        self._attr_unique_id = f"{unique_id_prefix}_leak"
+        self._attr_icon = "mdi:pipe-leak"
+        self._attr_has_entity_name = True
+        self._attr_device_class = BinarySensorDeviceClass.PROBLEM
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, unique_id_prefix)},
+            name="Águas de Coimbra"
+            if primary
+            else f"Águas de Coimbra {meter.numero_contador}",
+            manufacturer="Águas de Coimbra",
+            entry_type="service",
+        )
+        self._written_stale = None
+
+    @property
+    def _values(self) -> dict:
+        return (self.coordinator.data or {}).get(self.meter_id, {})
+
+    @property
+    def is_on(self) -> bool | None:
+        return self._values.get("leak")
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        return {**self._values.get("leak_details", {}), "stale": self.coordinator.stale}
+
+    def _handle_coordinator_update(self) -> None:
+        # Only a changed detection or flow causes a state write
+        if self.coordinator.stale == self._written_stale and not (
+            {(self.meter_id, "leak"), (self.meter_id, "leak_details")}
+            & self.coordinator.changed
+        ):
+            return
+        self._written_stale = self.coordinator.stale
+        super()._handle_coordinator_update()
@@ -0,0 +1,196 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from typing import Any
+from urllib.parse import urlsplit
+
+from aiohttp import ClientConnectionError, ClientSession
+
+# Values replaced by stable pseudonyms wherever they appear
+SENSITIVE_KEYS = {
+    "codigoMarca",
+    "codigoProduto",
+    "morada",
+    "nif",
+    "nome",
+    "numeroContador",
+    "password",
+    "subscriptionId",
+    "token",
+    "username",
+}
+# Response headers worth keeping
+RECORDED_HEADERS = ("Content-Type", "ETag")
+
+
+class _Anonymizer:
+    """Replace sensitive values with pseudonyms, the same value always
+    getting the same pseudonym, so recorded requests still match recorded
+    responses."""
+
+    def __init__(self) -> None:
+        self._pseudonyms: dict[str, str] = {}
+
+    def value(self, key: str, value: Any) -> Any:
+        if value is None or isinstance(value, (dict, list)):
+            return self.walk(value)
+        value = str(value)
+        if value not in self._pseudonyms:
+            self._pseudonyms[value] = f"{key}-{len(self._pseudonyms) + 1}"
+        return self._pseudonyms[value]
+
+    def walk(self, data: Any) -> Any:
+        if isinstance(data, dict):
+            return {
+                key: self.value(key, value)
+                if key in SENSITIVE_KEYS
+                else self.walk(value)
+                for key, value in data.items()
+            }
+        if isinstance(data, list):
+            return [self.walk(item) for item in data]
+        return data
+
+
+class AdCRecordedResponse:
+    """The parts of an aiohttp response AdCClient uses."""
+
+    def __init__(self, status: int, headers: dict, body: bytes) -> None:
+        self.status = status
+        self.headers = headers
+        self._body = body
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def json(self) -> Any:
+        return json.loads(self._body)
+
+
+class AdCRecordingSession:
+    """Pass requests through to a session, appending each exchange to a cassette.
+
+    Every exchange is written as one JSON line with its timing. Credentials,
+    tokens and identifiers are anonymized and request bodies are not kept.
+    """
+
+    def __init__(self, session: ClientSession, path: str) -> None:
+        self._session = session
+        self._path = path
+        self._anonymizer = _Anonymizer()
+
+    @asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[AdCRecordedResponse]:
+        start = time.monotonic()
+        async with self._session.request(method, url, **kwargs) as resp:
+            body = await resp.read()
+            response = AdCRecordedResponse(
+                resp.status,
+                {
+                    key: resp.headers[key]
+                    for key in RECORDED_HEADERS
+                    if key in resp.headers
+                },
+                body,
+            )
+        exchange = {
+            "recorded_at": time.time(),
+            "elapsed": time.monotonic() - start,
+            "method": method.upper(),
+            "path": urlsplit(url).path,
+            "params": {
+                key: str(value)
+                for key, value in self._anonymizer.walk(
+                    dict(kwargs.get("params") or {})
+                ).items()
+            },
+            "status": response.status,
+            "headers": response.headers,
+            "body": self._anonymize_body(body),
+        }
+        await asyncio.get_running_loop().run_in_executor(
+            None, self._append, json.dumps(exchange)
+        )
+        yield response
+
+    def _anonymize_body(self, body: bytes) -> Any:
+        try:
+            return self._anonymizer.walk(json.loads(body))
+        except ValueError:
+            # Error pages are kept out, they may echo anything back
+            return None
+
+    def _append(self, line: str) -> None:
+        with open(self._path, "a", encoding="utf-8") as cassette:
+            cassette.write(line + "\n")
+
+
+class AdCReplaySession:
+    """Serve the exchanges of a cassette instead of calling the portal.
+
+    Requests are matched on method, path and query parameters, falling back
+    to the next unused exchange of the same method and path, since dates in
+    the parameters depend on when the cassette was recorded. Recorded timings
+    are replayed when realtime is set. Login tokens are made valid again.
+    """
+
+    def __init__(self, path: str, realtime: bool = False) -> None:
+        self._realtime = realtime
+        self._exchanges: list[dict] = []
+        with open(path, encoding="utf-8") as cassette:
+            for line in cassette:
+                if line.strip():
+                    self._exchanges.append(json.loads(line))
+        self._used = [False] * len(self._exchanges)
+
+    def _match(self, method: str, path: str, params: dict) -> dict:
+        fallback = None
+        for index, exchange in enumerate(self._exchanges):
+            if (
+                self._used[index]
+                or exchange["method"] != method
+                or exchange["path"] != path
+            ):
+                continue
+            if exchange["params"] == params:
+                fallback = index
+                break
+            if fallback is None:
+                fallback = index
+        if fallback is None:
+            raise ClientConnectionError(f"No recorded exchange for {method} {path}")
+        self._used[fallback] = True
+        return self._exchanges[fallback]
+
+    @asynccontextmanager
+    async def request(
+        self, method: str, url: str, **kwargs: Any
+    ) -> AsyncIterator[AdCRecordedResponse]:
+        params = {
+            key: str(value) for key, value in (kwargs.get("params") or {}).items()
+        }
+        exchange = self._match(method.upper(), urlsplit(url).path, params)
+        if self._realtime:
+            await asyncio.sleep(exchange["elapsed"])
+
+        body = exchange["body"]
+        token = body.get("token") if isinstance(body, dict) else None
+        expiration = token.get("expirationDate") if isinstance(token, dict) else None
+        if isinstance(expiration, (int, float)):
+            # Shift the expiration as if the login happened now
+            shift = time.time() - exchange["recorded_at"]
+            if expiration > 1e11:
+                shift *= 1000
+            body = {**body, "token": {**token, "expirationDate": expiration + shift}}
+
+        yield AdCRecordedResponse(
+            exchange["status"],
+            exchange["headers"],
+            b"" if body is None else json.dumps(body).encode(),
+        )
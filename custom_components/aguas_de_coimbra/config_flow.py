@@ -8,7 +8,13 @@ from homeassistant import config_entries
 from homeassistant.data_entry_flow import FlowResult
 
 from .adc_client import AdCClient, CannotConnect, InvalidAuth
-from .const import DOMAIN
+from .const import (
+    DEFAULT_HISTORY_DAILY_DAYS,
+    DEFAULT_HISTORY_HOURLY_DAYS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DOMAIN,
+    STATISTICS_BACKFILL_MAX_DAYS,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -42,6 +48,8 @@ class ADCConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
                 _LOGGER.exception("Unexpected error: %s", e)
                 errors["base"] = "unknown"
             finally:
+                # The client is thrown away, stop its token refresh
+                client.shutdown()
                 await session.close()
 
             if not errors:
@@ -113,6 +121,30 @@ class ADCOptionsFlowHandler(config_entries.OptionsFlow):
                             self.config_entry.data.get("social_tariff", False),
                         ),
                     ): bool,
+                    vol.Optional(
+                        "max_concurrent_requests",
+                        default=self.config_entry.options.get(
+                            "max_concurrent_requests", DEFAULT_MAX_CONCURRENT_REQUESTS
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=1, max=10)),
+                    vol.Optional(
+                        "history_hourly_days",
+                        default=self.config_entry.options.get(
+                            "history_hourly_days", DEFAULT_HISTORY_HOURLY_DAYS
+                        ),
+                    ): vol.All(vol.Coerce(int), vol.Range(min=7)),
+                    vol.Optional(
+                        "history_daily_days",
+                        default=self.config_entry.options.get(
+                            "history_daily_days", DEFAULT_HISTORY_DAILY_DAYS
+                        ),
+                    ): vol.All(
+                        vol.Coerce(int), vol.Range(min=STATISTICS_BACKFILL_MAX_DAYS)
+                    ),
+                    vol.Optional(
+                        "record_traffic",
+                        default=self.config_entry.options.get("record_traffic", False),
+                    ): bool,
                 }
             ),
         )
@@ -1,9 +1,126 @@
-from datetime import timedelta
+from datetime import date, timedelta
 
 DOMAIN = "aguas_de_coimbra"
-DEFAULT_UPDATE_INTERVAL = timedelta(minutes=30)
+
+# Values are refreshed in tiers, each with its own interval
+TIER_FAST = "fast"
+TIER_SLOW = "slow"
+TIER_DAILY = "daily"
+FAST_UPDATE_INTERVAL = timedelta(minutes=30)
+SLOW_UPDATE_INTERVAL = timedelta(hours=2)
+# The daily tier checks hourly but only calls the portal once a day
+DAILY_UPDATE_INTERVAL = timedelta(hours=1)
+# The fast tier polls just after the next hourly reading is expected,
+# learning the portal's publication lag as readings arrive
+ADAPTIVE_DEFAULT_LAG = timedelta(hours=1)
+ADAPTIVE_LAG_SMOOTHING = 0.3
+ADAPTIVE_MIN_INTERVAL = timedelta(minutes=10)
+ADAPTIVE_MAX_INTERVAL = timedelta(hours=3)
+ADAPTIVE_POLL_MARGIN = timedelta(minutes=5)
+# Failing tiers back off exponentially up to this interval
+TIER_MAX_BACKOFF = timedelta(hours=6)
+TIER_KEYS = {
+    "today_consumption": TIER_FAST,
+    "last_successful_refresh": TIER_FAST,
+    "billing_cycle_consumption": TIER_SLOW,
+    "billing_cycle_cost": TIER_SLOW,
+    "meter_reading": TIER_DAILY,
+    "yesterday_consumption": TIER_DAILY,
+    "refresh_duration_p95": TIER_FAST,
+    "portal_requests": TIER_FAST,
+    "portal_logins": TIER_FAST,
+    "projected_cycle_consumption": TIER_SLOW,
+    "projected_cycle_cost": TIER_SLOW,
+    "forecast_details": TIER_SLOW,
+    "leak": TIER_FAST,
+    "leak_details": TIER_FAST,
+}
 BALCAO_DIGITAL_URL = "https://bdigital.aguasdecoimbra.pt/"
 
+# The meter keys and diameter rarely change, getContadores is only called
+# again for them after this long, after a failed usage query or a meter swap
+METER_IDENTITY_TTL = timedelta(days=30)
+# A getContadores response this recent is reused for the meter reading
+METER_DETAILS_MAX_AGE = timedelta(minutes=30)
+
+# Portal requests in flight at once across all the meters of an account
+DEFAULT_MAX_CONCURRENT_REQUESTS = 4
+
+# Tokens this close to their expiry are replaced in the background
+TOKEN_REFRESH_MARGIN = 300  # seconds
+# Assumed lifetime of a token whose expiration date can't be read
+TOKEN_DEFAULT_LIFETIME = 3600  # seconds
+# Background refreshes and their retries never run more often than this
+TOKEN_MIN_REFRESH_DELAY = 60  # seconds
+
+# Each request may take REQUEST_TIMEOUT, and timeouts, connection errors and
+# 5xx answers are retried after a jittered REQUEST_BACKOFF * 2^attempt delay
+REQUEST_TIMEOUT = 20  # seconds
+REQUEST_ATTEMPTS = 3
+REQUEST_BACKOFF = 1  # seconds
+# Time budget shared by all the requests of a single tier refresh
+REFRESH_DEADLINE = 90  # seconds
+# Consecutive failures that open the circuit breaker, and how long it stays
+# open before a single probe request is let through
+CIRCUIT_FAILURE_THRESHOLD = 5
+CIRCUIT_RESET_TIMEOUT = 300  # seconds
+
+# Portal answers remembered to skip decoding unchanged bodies
+RESPONSE_CACHE_SIZE = 32
+
+# A leak is reported after this many hours in a row with consumption, or
+# when the flow never drops below LEAK_NIGHT_FLOW litres per hour between
+# the night hours (local, both included)
+LEAK_CONTINUOUS_HOURS = 24
+LEAK_NIGHT_FLOW = 2
+LEAK_NIGHT_HOURS = (2, 5)
+# Weight of each new hour in the baseline flow moving average
+LEAK_BASELINE_SMOOTHING = 0.05
+# Hours of history read when a meter's detector starts
+LEAK_WARMUP_HOURS = 48
+
+# Weight of each new day in the per-weekday consumption profile used to
+# project the billing cycle
+FORECAST_PROFILE_SMOOTHING = 0.3
+
+# Upper bounds in seconds of the request latency histogram buckets
+LATENCY_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20)
+# Refresh durations kept per tier for the percentiles
+REFRESH_HISTORY_SIZE = 50
+
+# Persistent cache, one file per account shared by its config entries
+STORAGE_VERSION = 1
+STORAGE_SAVE_DELAY = 30  # seconds
+
+# Hourly consumption backfill into the long-term statistics
+STATISTICS_BACKFILL_CHUNK_DAYS = 30
+STATISTICS_BACKFILL_MAX_DAYS = 730
+STATISTICS_BACKFILL_DELAY = 10  # seconds between backfill requests
+
+# Usage history kept per meter: hourly readings, then daily totals, then
+# monthly totals. Daily totals must cover the statistics backfill
+DEFAULT_HISTORY_HOURLY_DAYS = 90
+DEFAULT_HISTORY_DAILY_DAYS = 1095
+HISTORY_MONTHLY_MONTHS = 120
+
+# Exports of the hourly consumption, under the config directory
+EXPORT_DIRECTORY = "aguas_de_coimbra_exports"
+EXPORT_FORMATS = ("csv", "parquet")
+
+# The portal keeps revising a day's readings for a few hours after midnight.
+# A day is considered final (and never fetched again) once this much time has
+# passed since the end of that day.
+USAGE_FINAL_DELAY = timedelta(hours=5)
+
+# Usage queries separated by at most this many days are merged into one request
+USAGE_MERGE_GAP_DAYS = 2
+
+# Longer usage ranges are fetched and streamed in windows of this many days
+USAGE_WINDOW_DAYS = 31
+
+# Keys that may hold the timestamp of a usage reading returned by the portal
+READING_DATE_KEYS = ("date", "data", "dataLeitura", "dataHora", "timestamp")
+
 # --- PRICES AND FEES ---
 
 # -- WATER
@@ -69,3 +186,32 @@ SOLID_WASTE_MANAGEMENT_TAX = 0.13
 # -- VAT
 
 VAT_RATE = 0.06
+
+
+# -- TARIFF VERSIONS
+
+# Each version applies from its effective date until the next one.
+# Add a new entry here when prices change, keeping the old ones so past
+# billing cycles are still priced at the tariff in force at the time.
+TARIFF_VERSIONS = [
+    {
+        # Current prices, also used for any date before a newer version
+        "effective_date": date.min,
+        "water_fixed_fee": WATER_FIXED_FEE,
+        "water_fixed_fee__social_tariff": WATER_FIXED_FEE__SOCIAL_TARIFF,
+        "water_consumption": WATER_CONSUMPTION,
+        "water_consumption__social_tariff": WATER_CONSUMPTION__SOCIAL_TARIFF,
+        "water_resources_tax": WATER_RESOURCES_TAX,
+        "sewage_fixed_fee": SEWAGE_FIXED_FEE,
+        "sewage_fixed_fee__social_tariff": SEWAGE_FIXED_FEE__SOCIAL_TARIFF,
+        "sewage_consumption": SEWAGE_CONSUMPTION,
+        "sewage_consumption__social_tariff": SEWAGE_CONSUMPTION__SOCIAL_TARIFF,
+        "sewage_resources_tax": SEWAGE_RESOURCES_TAX,
+        "solid_waste_fixed_fee": SOLID_WASTE_FIXED_FEE,
+        "solid_waste_fixed_fee__social_tariff": SOLID_WASTE_FIXED_FEE__SOCIAL_TARIFF,
+        "solid_waste_consumption": SOLID_WASTE_CONSUMPTION,
+        "solid_waste_consumption__social_tariff": SOLID_WASTE_CONSUMPTION__SOCIAL_TARIFF,
+        "solid_waste_management_tax": SOLID_WASTE_MANAGEMENT_TAX,
+        "vat_rate": VAT_RATE,
+    },
+]
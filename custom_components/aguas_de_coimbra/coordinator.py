@@ -1,31 +1,144 @@
+import asyncio
 import logging
+import time
+from collections.abc import Awaitable, Callable
+from datetime import date, timedelta
 
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
+from homeassistant.core import HomeAssistant, callback
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
+from homeassistant.helpers.storage import Store
 from homeassistant.helpers.update_coordinator import DataUpdateCoordinator
-from homeassistant.util import dt as dt_util
+from homeassistant.util import dt as dt_util, slugify
 
-from .adc_client import AdCClient
-from .const import DEFAULT_UPDATE_INTERVAL
+from .adc_client import AdCClient, AdCMeter
+from .cassette import AdCRecordingSession
+from .instrumentation import AdCClientStats
+from .forecast import AdCCycleForecaster
+from .leak import AdCLeakDetector
+from .scheduler import AdCPollScheduler
+from .statistics import AdCStatisticsImporter
+from .const import (
+    DAILY_UPDATE_INTERVAL,
+    DEFAULT_HISTORY_DAILY_DAYS,
+    DEFAULT_HISTORY_HOURLY_DAYS,
+    DEFAULT_MAX_CONCURRENT_REQUESTS,
+    DOMAIN,
+    FAST_UPDATE_INTERVAL,
+    HISTORY_MONTHLY_MONTHS,
+    REFRESH_DEADLINE,
+    SLOW_UPDATE_INTERVAL,
+    STORAGE_SAVE_DELAY,
+    STORAGE_VERSION,
+    TIER_DAILY,
+    TIER_FAST,
+    TIER_KEYS,
+    TIER_MAX_BACKOFF,
+    TIER_SLOW,
+)
 
 _LOGGER = logging.getLogger(__name__)
 
 
-class AdCCoordinator(DataUpdateCoordinator):
-    """Coordinator to fetch water usage data from Aguas de Coimbra."""
+_MISSING = object()
 
-    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+
+def entry_username(config_entry: ConfigEntry) -> str:
+    """The portal account of a config entry."""
+    return config_entry.options.get("username", config_entry.data.get("username"))
+
+
+def account_storage_key(username: str) -> str:
+    """Key of the persistent cache shared by the entries of an account."""
+    return f"{DOMAIN}.account_{slugify(username)}"
+
+
+class AdCTierCoordinator(DataUpdateCoordinator):
+    """Refresh one group of values on its own interval.
+
+    Failures keep the previous values and back off exponentially, up to
+    TIER_MAX_BACKOFF, so one slow or failing tier never delays the others.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        tier: str,
+        update_interval: timedelta,
+        fetch: Callable[[dict], Awaitable[None]],
+        next_interval: Callable[[], timedelta] | None = None,
+        stats: AdCClientStats | None = None,
+    ) -> None:
         super().__init__(
             hass,
             _LOGGER,
-            name="Aguas de Coimbra Coordinator",
-            update_interval=DEFAULT_UPDATE_INTERVAL,
+            name=f"Aguas de Coimbra {tier} Coordinator",
+            update_interval=update_interval,
         )
+        self.tier = tier
+        self._base_interval = update_interval
+        self._fetch = fetch
+        self._next_interval = next_interval
+        self._stats = stats
+        self._failures = 0
+        # True until the first live refresh, while sensors show restored values
+        self.stale = True
+        # (meter ID, key) of the values changed by the last refresh
+        self.changed: set[tuple[str, str]] = set()
 
-        username = config_entry.options.get(
-            "username", config_entry.data.get("username")
+    async def _async_update_data(self) -> dict:
+        """Fetch the values of this tier, keeping the previous ones on failure."""
+        previous = self.data or {}
+        # Fetch into a copy, so a refresh failing halfway leaves no values
+        # behind that the next one would take as already written
+        data = {meter_id: dict(values) for meter_id, values in previous.items()}
+        start = time.monotonic()
+        try:
+            await self._fetch(data)
+        except Exception as err:
+            self.changed = set()
+            self._failures += 1
+            self.update_interval = min(
+                self._base_interval * 2**self._failures, TIER_MAX_BACKOFF
+            )
+            _LOGGER.warning(
+                "Failed to refresh %s tier, retrying in %s: %s",
+                self.tier,
+                self.update_interval,
+                err,
+            )
+            return previous
+        finally:
+            if self._stats is not None:
+                self._stats.record_refresh(self.tier, time.monotonic() - start)
+
+        self._failures = 0
+        self.update_interval = (
+            self._next_interval() if self._next_interval else self._base_interval
         )
+        self.changed = {
+            (meter_id, key)
+            for meter_id, values in data.items()
+            for key, value in values.items()
+            if previous.get(meter_id, {}).get(key, _MISSING) != value
+        }
+        self.stale = False
+        return data
+
+
+class AdCCoordinator:
+    """Fetch water usage data from Aguas de Coimbra in fast, slow and daily tiers.
+
+    Every meter of the account is refreshed in parallel. The data of each
+    tier is keyed by meter ID.
+    """
+
+    def __init__(self, hass: HomeAssistant, config_entry: ConfigEntry) -> None:
+        username = entry_username(config_entry)
+        # Everything persisted is keyed by the account, not by whichever of
+        # its entries happened to be set up first
+        self._username = username
+        self.account_id = slugify(username)
         password = config_entry.options.get(
             "password", config_entry.data.get("password")
         )
@@ -36,78 +149,381 @@ class AdCCoordinator(DataUpdateCoordinator):
         social_tariff = config_entry.options.get(
             "social_tariff", config_entry.data.get("social_tariff", False)
         )
+        max_concurrent_requests = config_entry.options.get(
+            "max_concurrent_requests", DEFAULT_MAX_CONCURRENT_REQUESTS
+        )
         session = async_get_clientsession(hass)
+        if config_entry.options.get("record_traffic", False):
+            # Troubleshooting aid, replayable with AdCReplaySession
+            session = AdCRecordingSession(
+                session,
+                hass.config.path(f"{DOMAIN}_{self.account_id}.cassette.jsonl"),
+            )
+
+        # Ages after which the usage history is rolled up
+        self._history_hourly_days = config_entry.options.get(
+            "history_hourly_days", DEFAULT_HISTORY_HOURLY_DAYS
+        )
+        self._history_daily_days = config_entry.options.get(
+            "history_daily_days", DEFAULT_HISTORY_DAILY_DAYS
+        )
 
-        self.client = AdCClient(username, password, billing_day, social_tariff, session)
-        self._cached_meter_reading = 0
-        self._cached_yesterday = 0
+        self._hass = hass
+        self.client = AdCClient(
+            username,
+            password,
+            billing_day,
+            social_tariff,
+            session,
+            max_concurrent_requests,
+        )
         self._last_update = None
+        # The first meter ever found keeps the entity IDs used before
+        # multiple meters were supported
+        self.primary_meter_id: str | None = None
+        self._store = Store(hass, STORAGE_VERSION, account_storage_key(username))
+        self._first_refresh: asyncio.Task | None = None
+        self.statistics: dict[str, AdCStatisticsImporter] = {}
+        self._statistics_state: dict[str, dict] = {}
+        self.scheduler = AdCPollScheduler()
+        self.leaks: dict[str, AdCLeakDetector] = {}
+        self._leak_state: dict[str, dict] = {}
+        self.forecasts: dict[str, AdCCycleForecaster] = {}
+        self._forecast_state: dict[str, dict] = {}
 
-        self._data = {
-            "today_consumption": 0,
-            "yesterday_consumption": 0,
-            "meter_reading": 0,
-            "billing_cycle_consumption": 0,
-            "billing_cycle_cost": 0,
-            "last_successful_refresh": None,
+        self.tiers = {
+            TIER_FAST: AdCTierCoordinator(
+                hass,
+                TIER_FAST,
+                FAST_UPDATE_INTERVAL,
+                self._update_today,
+                self.scheduler.next_interval,
+                self.client.stats,
+            ),
+            TIER_SLOW: AdCTierCoordinator(
+                hass,
+                TIER_SLOW,
+                SLOW_UPDATE_INTERVAL,
+                self._update_billing_cycle,
+                stats=self.client.stats,
+            ),
+            TIER_DAILY: AdCTierCoordinator(
+                hass,
+                TIER_DAILY,
+                DAILY_UPDATE_INTERVAL,
+                self._update_daily,
+                stats=self.client.stats,
+            ),
         }
+        self._unsub_listeners = [
+            tier.async_add_listener(self.async_schedule_save)
+            for tier in self.tiers.values()
+        ]
 
-    async def _async_update_data(self) -> dict:
-        """Fetch updated data from the API."""
+    @property
+    def data(self) -> dict:
+        """All the values of every tier, keyed by meter ID."""
+        data: dict[str, dict] = {}
+        for tier in self.tiers.values():
+            for meter_id, values in (tier.data or {}).items():
+                data.setdefault(meter_id, {}).update(values)
+        return data
 
-        now = dt_util.now()
-        today_str = now.strftime("%Y-%m-%d")
-        self._data["last_successful_refresh"] = now
+    def unique_id_prefix(self, entry_id: str, meter_id: str) -> str:
+        """Prefix of the unique IDs of a meter's entities in a config entry."""
+        if meter_id == self.primary_meter_id:
+            return entry_id
+        return f"{entry_id}_{slugify(meter_id)}"
 
-        # Try to get today's consumption
-        try:
-            today_consumption = await self.client.get_consumption_day(today=True)
-            self._data["today_consumption"] = today_consumption
-        except Exception as err:
-            _LOGGER.warning("Failed to fetch today's consumption: %s", err)
+    @callback
+    def async_start(self) -> None:
+        """Fetch the first data in the background, so a slow portal doesn't hold
+        up startup."""
+        self._first_refresh = self._hass.async_create_background_task(
+            self.async_refresh(), f"{DOMAIN} first refresh {self.account_id}"
+        )
 
-        # Try to get billing cycle consumption
-        try:
-            billing_cycle = await self.client.get_consumption_billing_cycle()
-            self._data["billing_cycle_consumption"] = billing_cycle
-        except Exception as err:
-            _LOGGER.warning("Failed to fetch billing cycle consumption: %s", err)
+    @callback
+    def async_shutdown(self) -> None:
+        """Stop the scheduled refreshes and background tasks of the account."""
+        for unsub in self._unsub_listeners:
+            unsub()
+        self._unsub_listeners = []
+        self.client.shutdown()
+        if self._first_refresh is not None:
+            self._first_refresh.cancel()
+        for importer in self.statistics.values():
+            importer.async_cancel()
 
-        # Try to calculate billing cycle cost
-        try:
-            billing_cycle_cost = self.client.calculate_cost(
-                self._data["billing_cycle_consumption"]
+    async def _async_migrate_entry_cache(self) -> dict | None:
+        """Move a cache saved per config entry by earlier versions to the
+        account's store."""
+        for entry in self._hass.config_entries.async_entries(DOMAIN):
+            if entry_username(entry) != self._username:
+                continue
+            legacy = Store(self._hass, STORAGE_VERSION, f"{DOMAIN}.{entry.entry_id}")
+            cache = await legacy.async_load()
+            if not cache:
+                continue
+            # The statistics imported so far are named after that entry
+            cache["statistics_entry_id"] = entry.entry_id
+            await self._store.async_save(cache)
+            await legacy.async_remove()
+            return cache
+        return None
+
+    def _statistic_id(self, meter_id: str, object_id: str | None = None) -> str:
+        """ID of the hourly consumption statistics of a meter."""
+        object_id = object_id or self.account_id
+        if meter_id != self.primary_meter_id:
+            object_id = f"{object_id}_{meter_id}"
+        return f"{DOMAIN}:{slugify(object_id)}_hourly_consumption"
+
+    async def async_load_cache(self) -> None:
+        """Restore the client and sensor state saved before the last restart."""
+        cache = await self._store.async_load()
+        if not cache:
+            cache = await self._async_migrate_entry_cache()
+        if not cache:
+            return
+
+        self.client.restore_state(cache.get("client", {}))
+        self.scheduler.restore_state(cache.get("scheduler", {}))
+        self._leak_state = cache.get("leaks", {})
+        self._forecast_state = cache.get("forecasts", {})
+        self._last_update = cache.get("last_update")
+        self.primary_meter_id = cache.get("primary_meter_id") or next(
+            iter(self.client.meters), None
+        )
+
+        data = cache.get("data", {})
+        statistics = cache.get("statistics", {})
+        if "primary_meter_id" not in cache and self.primary_meter_id:
+            # Single meter layout saved before multiple meters were supported
+            data = {self.primary_meter_id: data}
+            statistics = {self.primary_meter_id: statistics}
+        if cache.get("statistics_entry_id"):
+            for meter_id, state in statistics.items():
+                state.setdefault(
+                    "statistic_id",
+                    self._statistic_id(meter_id, cache["statistics_entry_id"]),
+                )
+        self._statistics_state = statistics
+
+        for values in data.values():
+            if values.get("last_successful_refresh") is not None:
+                values["last_successful_refresh"] = dt_util.parse_datetime(
+                    values["last_successful_refresh"]
+                )
+
+        # Expose the snapshot to the sensors until the first live refresh
+        for tier_name, tier in self.tiers.items():
+            tier.data = {
+                meter_id: {
+                    key: value
+                    for key, value in values.items()
+                    if TIER_KEYS.get(key) == tier_name
+                }
+                for meter_id, values in data.items()
+            }
+
+    async def async_refresh(self) -> None:
+        """Refresh every tier concurrently."""
+        await asyncio.gather(*(tier.async_refresh() for tier in self.tiers.values()))
+
+    def _cache_data(self) -> dict:
+        """Build the data written to the persistent cache."""
+        statistics = dict(self._statistics_state)
+        for meter_id, importer in self.statistics.items():
+            statistics[meter_id] = importer.export_state()
+        return {
+            "client": self.client.export_state(),
+            "statistics": statistics,
+            "scheduler": self.scheduler.export_state(),
+            "leaks": {
+                **self._leak_state,
+                **{
+                    meter_id: detector.export_state()
+                    for meter_id, detector in self.leaks.items()
+                },
+            },
+            "forecasts": {
+                **self._forecast_state,
+                **{
+                    meter_id: forecaster.export_state()
+                    for meter_id, forecaster in self.forecasts.items()
+                },
+            },
+            "last_update": self._last_update,
+            "primary_meter_id": self.primary_meter_id,
+            "data": self.data,
+        }
+
+    @callback
+    def async_schedule_save(self) -> None:
+        """Write the persistent cache in the background, coalescing close saves."""
+        self._store.async_delay_save(self._cache_data, STORAGE_SAVE_DELAY)
+
+    @callback
+    def async_schedule_statistics_import(self) -> None:
+        """Import the new hourly consumption of every meter into the statistics."""
+        for meter_id, meter in self.client.meters.items():
+            if meter_id not in self.statistics:
+                importer = AdCStatisticsImporter(
+                    self._hass,
+                    meter,
+                    self._statistic_id(meter_id),
+                    self.async_schedule_save,
+                )
+                importer.restore_state(self._statistics_state.get(meter_id, {}))
+                self.statistics[meter_id] = importer
+            self.statistics[meter_id].async_schedule_import()
+
+    async def _for_each_meter(
+        self, data: dict, fetch: Callable[[AdCMeter, dict], Awaitable[None]]
+    ) -> None:
+        """Run a fetch for every meter in parallel, raising the first failure."""
+        with self.client.deadline(REFRESH_DEADLINE):
+            meters = await self.client.discover_meters()
+            if self.primary_meter_id is None and meters:
+                self.primary_meter_id = next(iter(meters))
+
+            results = await asyncio.gather(
+                *(
+                    fetch(meter, data.setdefault(meter_id, {}))
+                    for meter_id, meter in meters.items()
+                ),
+                return_exceptions=True,
+            )
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def _update_today(self, data: dict) -> None:
+        """Refresh today's consumption."""
+        await self._for_each_meter(data, self._update_meter_today)
+        self.scheduler.observe(
+            max(
+                (
+                    meter.newest_reading
+                    for meter in self.client.meters.values()
+                    if meter.newest_reading is not None
+                ),
+                default=None,
+            )
+        )
+        if self.primary_meter_id in data:
+            # Account wide diagnostics, shown on the primary meter's device
+            data[self.primary_meter_id].update(
+                refresh_duration_p95=self.client.stats.refresh_p95(),
+                portal_requests=self.client.stats.total_calls,
+                portal_logins=self.client.login_count,
             )
-            self._data["billing_cycle_cost"] = billing_cycle_cost
-        except Exception as err:
-            _LOGGER.warning("Failed to calculate billing cycle cost: %s", err)
+
+    async def _update_meter_today(self, meter: AdCMeter, data: dict) -> None:
+        await meter.update_usage(today_only=True)
+        data["today_consumption"] = await meter.get_consumption_day(today=True)
+
+        if meter.meter_id not in self.leaks:
+            detector = AdCLeakDetector()
+            detector.restore_state(self._leak_state.get(meter.meter_id, {}))
+            self.leaks[meter.meter_id] = detector
+        detector = self.leaks[meter.meter_id]
+        detector.update(meter.history, meter.newest_reading)
+        data["leak"] = detector.leak
+        data["leak_details"] = detector.attributes
+        data["last_successful_refresh"] = dt_util.now()
+
+    async def _update_billing_cycle(self, data: dict) -> None:
+        """Refresh the billing cycle consumption and cost."""
+        await self._for_each_meter(data, self._update_meter_billing_cycle)
+
+    async def _update_meter_billing_cycle(self, meter: AdCMeter, data: dict) -> None:
+        # Fetch every open day of the cycle in as few requests as possible
+        await meter.update_usage()
+        data["billing_cycle_consumption"] = await meter.get_consumption_billing_cycle()
+        data["billing_cycle_cost"] = meter.calculate_cost(
+            data["billing_cycle_consumption"]
+        )
+
+        if meter.meter_id not in self.forecasts:
+            forecaster = AdCCycleForecaster()
+            forecaster.restore_state(self._forecast_state.get(meter.meter_id, {}))
+            self.forecasts[meter.meter_id] = forecaster
+        forecaster = self.forecasts[meter.meter_id]
+        cycle_start, today = meter._get_billing_cycle_range()
+        forecaster.update(meter.history, cycle_start)
+        forecast = forecaster.project(
+            meter.history,
+            cycle_start,
+            meter.get_billing_cycle_end(),
+            today,
+            meter.diameter,
+            self.client.social_tariff,
+        )
+        data["projected_cycle_consumption"] = forecast["consumption"]
+        data["projected_cycle_cost"] = forecast["cost"]
+        data["forecast_details"] = forecast["details"]
+
+    async def _update_daily(self, data: dict) -> None:
+        """Refresh the meter reading and yesterday's consumption once a day."""
+
+        now = dt_util.now()
+        today_str = now.strftime("%Y-%m-%d")
 
         # Only update meter reading and yesterday if it's a new day
-        if self._last_update != today_str:
-            # Only fetch yesterday's consumption and meter reading if the date has changed
-            # This is to avoid unnecessary API calls
-            _LOGGER.debug("Fetching new yesterday_consumption and meter_reading")
-
-            try:
-                self._cached_meter_reading = await self.client.get_last_meter_reading()
-                self._data["meter_reading"] = self._cached_meter_reading
-            except Exception as err:
-                _LOGGER.warning("Failed to fetch last meter reading: %s", err)
-
-            try:
-                self._cached_yesterday = await self.client.get_consumption_day(
-                    today=False
-                )
-                self._data["yesterday_consumption"] = self._cached_yesterday
-            except Exception as err:
-                _LOGGER.warning("Failed to fetch yesterday's consumption: %s", err)
-
-            if now.hour >= 5:
-                # Meter reading is usually updated around midnight. 
-                # "Yesterday" might take a few hours to be fully updated.
-                # Cache it only after 5 AM to allow some buffer time for the update
-                self._last_update = today_str
-        else:
+        # This is to avoid unnecessary API calls
+        if self._last_update == today_str:
             _LOGGER.debug("Using cached yesterday_consumption and meter_reading")
+            return
+        _LOGGER.debug("Fetching new yesterday_consumption and meter_reading")
+
+        await self._for_each_meter(data, self._update_meter_daily)
+        self._compact_histories(now.date())
+
+        if now.hour >= 5:
+            # Meter reading is usually updated around midnight.
+            # "Yesterday" might take a few hours to be fully updated.
+            # Cache it only after 5 AM to allow some buffer time for the update
+            self._last_update = today_str
+
+    async def _update_meter_daily(self, meter: AdCMeter, data: dict) -> None:
+        # Usage and meter reading are independent, fetch them concurrently
+        meter_reading, yesterday = await asyncio.gather(
+            meter.get_last_meter_reading(),
+            self._get_yesterday(meter),
+            return_exceptions=True,
+        )
+        if not isinstance(meter_reading, Exception):
+            data["meter_reading"] = meter_reading
+        if not isinstance(yesterday, Exception):
+            data["yesterday_consumption"] = yesterday
+        for err in (meter_reading, yesterday):
+            if isinstance(err, Exception):
+                raise err
+
+    def _compact_histories(self, today: date) -> None:
+        """Roll up the usage history of every meter, once a day."""
+        days_before = today - timedelta(days=self._history_daily_days)
+        months_before = days_before.replace(day=1)
+        for _ in range(HISTORY_MONTHLY_MONTHS):
+            months_before = (months_before - timedelta(days=1)).replace(day=1)
+
+        for meter_id, meter in self.client.meters.items():
+            importer = self.statistics.get(meter_id)
+            if importer is None or importer.next_day is None:
+                # Keep every hour until the statistics import has run
+                continue
+            meter.history.compact(
+                min(
+                    today - timedelta(days=self._history_hourly_days),
+                    importer.next_day,
+                ),
+                days_before,
+                months_before,
+            )
 
-        return self._data
+    async def _get_yesterday(self, meter: AdCMeter) -> float:
+        """Refresh yesterday's consumption while the portal may still revise it."""
+        yesterday = dt_util.now().date() - timedelta(days=1)
+        return await meter.load_usage(yesterday, yesterday, refresh_open=True)
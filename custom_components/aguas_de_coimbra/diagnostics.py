@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN
+
+TO_REDACT = {"username", "password"}
+
+
+async def async_get_config_entry_diagnostics(
+    hass: HomeAssistant, entry: ConfigEntry
+) -> dict:
+    """Return the request instrumentation and refresh state of a config entry."""
+    coordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    return {
+        "entry": {
+            "data": async_redact_data(dict(entry.data), TO_REDACT),
+            "options": async_redact_data(dict(entry.options), TO_REDACT),
+        },
+        "meter_count": len(coordinator.client.meters),
+        "tiers": {
+            name: {
+                "update_interval": str(tier.update_interval),
+                "stale": tier.stale,
+                "last_update_success": tier.last_update_success,
+            }
+            for name, tier in coordinator.tiers.items()
+        },
+        "scheduler": coordinator.scheduler.export_state(),
+        "client": coordinator.client.diagnostics(),
+    }
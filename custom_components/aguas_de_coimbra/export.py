@@ -0,0 +1,197 @@
+from __future__ import annotations
+
+import csv
+import importlib
+import json
+import os
+from collections.abc import AsyncIterator
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from homeassistant.core import HomeAssistant
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.util import dt as dt_util
+
+from .adc_client import AdCMeter
+from .const import USAGE_WINDOW_DAYS
+
+CSV_HEADER = ("timestamp", "consumption")
+
+
+async def _iter_chunks(
+    meter: AdCMeter, initial_day: date, final_day: date
+) -> AsyncIterator[tuple[date, date, list[tuple[datetime, float]]]]:
+    """Yield the readings of a range of days, one window at a time."""
+    window_start = initial_day
+    while window_start <= final_day:
+        window_end = min(
+            window_start + timedelta(days=USAGE_WINDOW_DAYS - 1), final_day
+        )
+        readings = [
+            reading
+            async for reading in meter._client.iter_usage(
+                meter, window_start, window_end
+            )
+        ]
+        yield window_start, window_end, readings
+        window_start = window_end + timedelta(days=1)
+
+
+class AdCUsageExport:
+    """Write the hourly readings of a meter to a CSV file or a Parquet dataset.
+
+    Readings are fetched, converted and written one window at a time, the
+    file writes running in the executor. After each window a resume marker
+    next to the output records the next day to fetch, so an interrupted
+    export of the same range continues from there. A Parquet export is a
+    directory with one file per window, since Parquet files can't be appended.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        meter: AdCMeter,
+        initial_day: date,
+        final_day: date,
+        export_format: str,
+        path: Path,
+    ) -> None:
+        self.hass = hass
+        self.meter = meter
+        self.initial_day = initial_day
+        self.final_day = final_day
+        self.format = export_format
+        self.path = path
+        self.marker_path = path.with_name(f"{path.name}.resume")
+        # pyarrow modules, imported in the executor when needed
+        self._pyarrow: Any = None
+        self._parquet: Any = None
+
+    def _marker_key(self) -> dict:
+        """What a resume marker must match to be continued."""
+        return {
+            "meter": self.meter.meter_id,
+            "format": self.format,
+            "initial_day": self.initial_day.isoformat(),
+            "final_day": self.final_day.isoformat(),
+        }
+
+    def _load_marker(self) -> dict | None:
+        try:
+            marker = json.loads(self.marker_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+        key = self._marker_key()
+        if {name: marker.get(name) for name in key} != key:
+            return None
+        return marker
+
+    def _save_marker(self, next_day: date, rows: int, offset: int) -> None:
+        """Replace the marker atomically, it must never be half written."""
+        temporary = self.marker_path.with_name(f"{self.marker_path.name}.tmp")
+        temporary.write_text(
+            json.dumps(
+                {
+                    **self._marker_key(),
+                    "next_day": next_day.isoformat(),
+                    "rows": rows,
+                    "offset": offset,
+                }
+            ),
+            encoding="utf-8",
+        )
+        os.replace(temporary, self.marker_path)
+
+    def _prepare(self) -> dict | None:
+        """Open the marker of an interrupted export, or clear the output."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        marker = self._load_marker()
+        if self.format == "parquet":
+            self._pyarrow = importlib.import_module("pyarrow")
+            self._parquet = importlib.import_module("pyarrow.parquet")
+            self.path.mkdir(exist_ok=True)
+            if marker is None:
+                for part in self.path.glob("part-*.parquet"):
+                    part.unlink()
+        elif marker is None:
+            self.path.unlink(missing_ok=True)
+        elif self.path.exists():
+            # Drop anything written after the last complete window
+            with self.path.open("r+b") as file:
+                file.truncate(marker["offset"])
+        return marker
+
+    def _write_csv(self, readings: list[tuple[datetime, float]]) -> int:
+        """Append readings to the CSV file and return its new size."""
+        new_file = not self.path.exists()
+        with self.path.open("a", encoding="utf-8", newline="") as file:
+            writer = csv.writer(file)
+            if new_file:
+                writer.writerow(CSV_HEADER)
+            writer.writerows(
+                (reading_time.isoformat(), litres)
+                for reading_time, litres in readings
+            )
+        return self.path.stat().st_size
+
+    def _write_parquet(
+        self, window_start: date, readings: list[tuple[datetime, float]]
+    ) -> None:
+        """Write one window as its own file of the dataset."""
+        if not readings:
+            return
+        table = self._pyarrow.table(
+            {
+                "timestamp": [dt_util.as_utc(time) for time, _ in readings],
+                "consumption": [float(litres) for _, litres in readings],
+            }
+        )
+        self._parquet.write_table(
+            table, self.path / f"part-{window_start:%Y%m%d}.parquet"
+        )
+
+    def _write(
+        self,
+        window_start: date,
+        next_day: date,
+        readings: list[tuple[datetime, float]],
+        rows: int,
+    ) -> None:
+        offset = 0
+        if self.format == "parquet":
+            self._write_parquet(window_start, readings)
+        else:
+            offset = self._write_csv(readings)
+        self._save_marker(next_day, rows, offset)
+
+    async def async_run(self) -> dict:
+        """Export the range, continuing an interrupted export if there is one."""
+        try:
+            marker = await self.hass.async_add_executor_job(self._prepare)
+        except ImportError as err:
+            raise HomeAssistantError("Parquet exports need pyarrow installed") from err
+
+        initial_day, rows = self.initial_day, 0
+        if marker is not None:
+            initial_day = dt_util.parse_date(marker["next_day"])
+            rows = marker["rows"]
+
+        async for window_start, window_end, readings in _iter_chunks(
+            self.meter, initial_day, self.final_day
+        ):
+            rows += len(readings)
+            await self.hass.async_add_executor_job(
+                self._write,
+                window_start,
+                window_end + timedelta(days=1),
+                readings,
+                rows,
+            )
+
+        await self.hass.async_add_executor_job(self.marker_path.unlink, True)
+        return {
+            "path": str(self.path),
+            "rows": rows,
+            "resumed_from": None if marker is None else marker["next_day"],
+        }
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from .const import FORECAST_PROFILE_SMOOTHING
+from .history import AdCUsageHistory
+from .tariff import get_tariff
+
+
+class AdCCycleForecaster:
+    """Project the consumption and cost of a billing cycle at its end.
+
+    A daily profile keeps, per day of the week, an exponential moving average
+    of the litres consumed. Each final day updates it once, so the model never
+    reads the cycle again. The projection adds the profile of the days left to
+    the consumption so far.
+    """
+
+    def __init__(self) -> None:
+        self._profile: list[float | None] = [None] * 7
+        # Last final day added to the profile
+        self._last_day: date | None = None
+
+    def export_state(self) -> dict:
+        """Return the profile saved in the persistent cache."""
+        return {
+            "profile": self._profile,
+            "last_day": self._last_day.isoformat() if self._last_day else None,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the profile saved by export_state."""
+        if len(state.get("profile", [])) == 7:
+            self._profile = state["profile"]
+        if state.get("last_day"):
+            self._last_day = dt_util.parse_date(state["last_day"])
+
+    def update(self, history: AdCUsageHistory, first_day: date) -> None:
+        """Add the days that became final since the last update to the profile.
+
+        Days before first_day that were never read are skipped.
+        """
+        day = first_day
+        if self._last_day is not None and self._last_day >= first_day:
+            day = self._last_day + timedelta(days=1)
+        while history.is_final(day):
+            litres = history.day_total(day)
+            average = self._profile[day.weekday()]
+            self._profile[day.weekday()] = (
+                litres
+                if average is None
+                else average + (litres - average) * FORECAST_PROFILE_SMOOTHING
+            )
+            self._last_day = day
+            day += timedelta(days=1)
+
+    def _expected(self, day: date) -> float:
+        """Litres expected on a day, from its weekday or the overall average."""
+        average = self._profile[day.weekday()]
+        if average is not None:
+            return average
+        known = [value for value in self._profile if value is not None]
+        return sum(known) / len(known) if known else 0
+
+    def project(
+        self,
+        history: AdCUsageHistory,
+        cycle_start: date,
+        cycle_end: date,
+        today: date,
+        diameter: int,
+        social_tariff: bool,
+    ) -> dict:
+        """Project the cycle totals, and when the next water tier is reached."""
+        consumed = history.total(cycle_start, today)
+        # What is still expected today, then every day left
+        litres = consumed + max(
+            self._expected(today) - history.day_total(today), 0
+        )
+        crossing_day = None
+        tariff = get_tariff(cycle_start)
+        table = tariff.water_table(social_tariff)
+        tier = table.tier(consumed / 1000)
+        next_threshold = (
+            table.breakpoints[tier] if tier < len(table.breakpoints) - 1 else None
+        )
+        if next_threshold is not None and litres / 1000 > next_threshold:
+            crossing_day = today
+
+        day = today + timedelta(days=1)
+        while day <= cycle_end:
+            litres += self._expected(day)
+            if (
+                crossing_day is None
+                and next_threshold is not None
+                and litres / 1000 > next_threshold
+            ):
+                crossing_day = day
+            day += timedelta(days=1)
+
+        consumption_m3 = litres / 1000
+        days_in_cycle = (cycle_end - cycle_start).days + 1
+        return {
+            "consumption": round(consumption_m3, 2),
+            "cost": round(
+                tariff.total_cost(
+                    consumption_m3, days_in_cycle, diameter, social_tariff
+                ),
+                2,
+            ),
+            "details": {
+                "cycle_end": cycle_end.isoformat(),
+                "current_tier": tier + 1,
+                "projected_tier": table.tier(consumption_m3) + 1,
+                "next_tier_threshold": next_threshold,
+                "next_tier_crossing": crossing_day.isoformat()
+                if crossing_day
+                else None,
+            },
+        }
@@ -0,0 +1,329 @@
+from __future__ import annotations
+
+from array import array
+from collections.abc import Iterator
+from datetime import date, timedelta
+
+HOURS_PER_DAY = 24
+
+_MISSING = 0
+_OPEN = 1
+_FINAL = 2
+_STATE = 3
+# Set on days whose hourly readings are still kept
+_HAS_HOURS = 4
+
+
+def _month_start(day: date, start_day: int) -> date:
+    """First day of the month of a day, for months starting on start_day."""
+    if day.day >= start_day:
+        return day.replace(day=start_day)
+    return (day.replace(day=1) - timedelta(days=1)).replace(day=start_day)
+
+
+def _month_end(month: date) -> date:
+    """Last day of the month starting on a day, up to the 28th."""
+    if month.month == 12:
+        return month.replace(year=month.year + 1, month=1) - timedelta(days=1)
+    return month.replace(month=month.month + 1) - timedelta(days=1)
+
+
+def _day_bit(month: date, day: date) -> int:
+    """Bit of a day in the mask of the days a month total covers."""
+    return 1 << (day - month).days
+
+
+def _days_mask(month: date, first_day: date, last_day: date) -> int:
+    """Mask of the days from first_day to last_day of a month."""
+    return (1 << ((last_day - month).days + 1)) - (1 << (first_day - month).days)
+
+
+class AdCUsageHistory:
+    """Litres of a meter at three levels: hours, days and months.
+
+    Recent days keep their hourly readings. Older days are compacted to a
+    daily total, and whole months older still to a monthly total, so the
+    history stays bounded however long the integration runs. Rollups keep
+    the exact totals of what they replace.
+
+    Days are stored in flat arrays indexed from _first_day: a total and a
+    status byte per day, and HOURS_PER_DAY slots of _hours for the days from
+    _hours_from on. Per-day prefix sums make the total of any range of days
+    O(1); they are rebuilt lazily, from the first day changed since the last
+    query. Months only hold days before _first_day. Each month total comes
+    with a mask of the days it covers, those days are final and are never
+    fetched again; a range covering part of them gets its share of the total.
+    Months start on month_start_day, the first day of the billing cycle, so
+    billing cycle totals stay exact.
+    """
+
+    def __init__(self, month_start_day: int = 1) -> None:
+        self._month_start_day = month_start_day
+        self._first_day: date | None = None
+        self._totals = array("d")
+        self._status = array("B")
+        self._prefix = array("d", [0.0])
+        # Index of the first day whose prefix sum is out of date
+        self._dirty_from: int | None = None
+        self._hours = array("d")
+        # Index of the first day with hourly slots in _hours
+        self._hours_from = 0
+        # Litres per month and mask of the days they cover, keyed by the
+        # first day of the month. Months rolled up before month_start_day
+        # changed keep their own first day
+        self._months: dict[date, tuple[float, int]] = {}
+
+    def _index(self, day: date) -> int | None:
+        """Position of a day in the arrays, None if outside them."""
+        if self._first_day is None:
+            return None
+        index = (day - self._first_day).days
+        if 0 <= index < len(self._status):
+            return index
+        return None
+
+    def _before_days(self, day: date) -> bool:
+        """Whether a day belongs to the month level."""
+        return (
+            bool(self._months)
+            and self._first_day is not None
+            and day < self._first_day
+        )
+
+    def _month_with(self, day: date) -> date | None:
+        """First day of the rolled up month whose total covers a day."""
+        for month, (_, mask) in self._months.items():
+            if month <= day <= _month_end(month) and mask & _day_bit(month, day):
+                return month
+        return None
+
+    def _rolled_up(self, day: date) -> bool:
+        """Whether a day is part of a month total."""
+        return self._before_days(day) and self._month_with(day) is not None
+
+    def _grow(self, day: date) -> int:
+        """Make room for a day and return its position."""
+        if self._first_day is None:
+            self._first_day = day
+        if day < self._first_day:
+            # Backfill walks back in time, prepend the missing days
+            missing = (self._first_day - day).days
+            self._totals = array("d", bytes(8 * missing)) + self._totals
+            self._status = array("B", bytes(missing)) + self._status
+            self._prefix = array("d", bytes(8 * missing)) + self._prefix
+            self._hours_from += missing
+            self._first_day = day
+            self._dirty_from = 0
+
+        index = (day - self._first_day).days
+        if index >= len(self._status):
+            missing = index + 1 - len(self._status)
+            self._totals.extend(array("d", bytes(8 * missing)))
+            self._status.extend(array("B", bytes(missing)))
+            self._prefix.extend(array("d", bytes(8 * missing)))
+            self._hours.extend(array("d", bytes(8 * HOURS_PER_DAY * missing)))
+            self._mark_dirty(len(self._status) - missing)
+        return index
+
+    def _mark_dirty(self, index: int) -> None:
+        if self._dirty_from is None or index < self._dirty_from:
+            self._dirty_from = index
+
+    def _update_prefix(self) -> None:
+        """Recompute the prefix sums from the first changed day on."""
+        if self._dirty_from is None:
+            return
+        totals = self._totals
+        prefix = self._prefix
+        for index in range(self._dirty_from, len(self._status)):
+            prefix[index + 1] = prefix[index] + totals[index]
+        self._dirty_from = None
+
+    def set_day(
+        self, day: date, total: float, hours: list[float] | None, final: bool
+    ) -> None:
+        """Store the readings of a day, or only its total if hours is None.
+
+        Readings the portal sent without a timestamp are booked at midnight,
+        so the hours always add up to the day total. Days older than the
+        stored days are added to their month once rolled up months exist, and
+        are left alone if already part of it.
+        """
+        if self._before_days(day):
+            if self._month_with(day) is None:
+                month = _month_start(day, self._month_start_day)
+                litres, mask = self._months.get(month, (0.0, 0))
+                self._months[month] = (litres + total, mask | _day_bit(month, day))
+            return
+        index = self._grow(day)
+        self._totals[index] = total
+        self._status[index] = _FINAL if final else _OPEN
+        self._mark_dirty(index)
+        if hours is None:
+            if index >= self._hours_from:
+                start = (index - self._hours_from) * HOURS_PER_DAY
+                self._hours[start : start + HOURS_PER_DAY] = array(
+                    "d", bytes(8 * HOURS_PER_DAY)
+                )
+            return
+
+        if index < self._hours_from:
+            # Hours of an older day, e.g. from the statistics backfill
+            missing = self._hours_from - index
+            self._hours = array("d", bytes(8 * HOURS_PER_DAY * missing)) + self._hours
+            self._hours_from = index
+        hours = list(hours[:HOURS_PER_DAY])
+        hours.extend([0.0] * (HOURS_PER_DAY - len(hours)))
+        hours[0] += total - sum(hours)
+        start = (index - self._hours_from) * HOURS_PER_DAY
+        self._hours[start : start + HOURS_PER_DAY] = array("d", hours)
+        self._status[index] |= _HAS_HOURS
+
+    def set_month(self, month: date, total: float, mask: int) -> None:
+        """Restore the total of a rolled up month, as saved by months().
+
+        Restore the days first, months are always older than them.
+        """
+        self._months[month] = (total, mask)
+
+    def mark_final(self, day: date) -> None:
+        """Mark a stored day as no longer revised by the portal."""
+        index = self._index(day)
+        if index is not None and self._status[index] & _STATE == _OPEN:
+            self._status[index] = self._status[index] & _HAS_HOURS | _FINAL
+
+    def has_day(self, day: date) -> bool:
+        if self._rolled_up(day):
+            return True
+        index = self._index(day)
+        return index is not None and self._status[index] != _MISSING
+
+    def is_final(self, day: date) -> bool:
+        if self._rolled_up(day):
+            return True
+        index = self._index(day)
+        return index is not None and self._status[index] & _STATE == _FINAL
+
+    def total(self, initial_day: date, final_day: date) -> float:
+        """Litres consumed from initial_day to final_day, both included.
+
+        Ranges that only cover part of a rolled up month count its share of
+        the days, see is_estimate.
+        """
+        if self._first_day is None or final_day < initial_day:
+            return 0
+        litres = 0.0
+        if self._before_days(initial_day):
+            litres += self._months_total(
+                initial_day, min(final_day, self._first_day - timedelta(days=1))
+            )
+
+        first = max((initial_day - self._first_day).days, 0)
+        last = min((final_day - self._first_day).days, len(self._status) - 1)
+        if last < first:
+            return litres
+        self._update_prefix()
+        return litres + self._prefix[last + 1] - self._prefix[first]
+
+    def _months_total(self, initial_day: date, final_day: date) -> float:
+        """Litres of the rolled up months in a range of days."""
+        litres = 0.0
+        for month, (month_total, mask) in self._months.items():
+            start, end = max(month, initial_day), min(_month_end(month), final_day)
+            if end < start:
+                continue
+            covered = mask & _days_mask(month, start, end)
+            if covered == mask:
+                litres += month_total
+            elif covered:
+                litres += month_total * covered.bit_count() / mask.bit_count()
+        return litres
+
+    def is_estimate(self, initial_day: date, final_day: date) -> bool:
+        """Whether the total of a range only has a share of a rolled up month."""
+        if not self._before_days(initial_day):
+            return False
+        for month, (_, mask) in self._months.items():
+            start, end = max(month, initial_day), min(_month_end(month), final_day)
+            if end < start:
+                continue
+            covered = mask & _days_mask(month, start, end)
+            if covered and covered != mask:
+                return True
+        return False
+
+    def day_total(self, day: date) -> float:
+        """Litres consumed on a day."""
+        index = self._index(day)
+        if index is None:
+            return self.total(day, day)
+        return self._totals[index]
+
+    def hours(self, day: date) -> list[float] | None:
+        """Hourly litres of a stored day, None once compacted."""
+        index = self._index(day)
+        if index is None or not self._status[index] & _HAS_HOURS:
+            return None
+        start = (index - self._hours_from) * HOURS_PER_DAY
+        return self._hours[start : start + HOURS_PER_DAY].tolist()
+
+    def days(self) -> Iterator[tuple[date, bool]]:
+        """Every day stored at day or hour level, oldest first, and whether it
+        is final."""
+        for index, status in enumerate(self._status):
+            if status != _MISSING:
+                yield self._first_day + timedelta(days=index), (
+                    status & _STATE == _FINAL
+                )
+
+    def months(self) -> Iterator[tuple[date, float, int]]:
+        """Every rolled up month, oldest first, its litres and the mask of the
+        days they cover."""
+        for month, (litres, mask) in sorted(self._months.items()):
+            yield month, litres, mask
+
+    def compact(
+        self, hours_before: date, days_before: date, months_before: date
+    ) -> None:
+        """Roll up the hours of the days before hours_before into day totals,
+        the whole months before days_before into month totals, and drop the
+        months before months_before.
+        """
+        if self._first_day is None:
+            return
+
+        # Hours to day totals, the totals are already kept per day
+        hours_end = min(
+            max((hours_before - self._first_day).days, self._hours_from),
+            len(self._status),
+        )
+        if hours_end > self._hours_from:
+            for index in range(self._hours_from, hours_end):
+                self._status[index] &= _STATE
+            del self._hours[: (hours_end - self._hours_from) * HOURS_PER_DAY]
+            self._hours_from = hours_end
+
+        # Days to months, never a day that still has its hours
+        cutoff = _month_start(days_before, self._month_start_day)
+        days_end = min((cutoff - self._first_day).days, self._hours_from)
+        if days_end > 0:
+            for index in range(days_end):
+                if self._status[index] == _MISSING:
+                    continue
+                day = self._first_day + timedelta(days=index)
+                month = _month_start(day, self._month_start_day)
+                litres, mask = self._months.get(month, (0.0, 0))
+                self._months[month] = (
+                    litres + self._totals[index],
+                    mask | _day_bit(month, day),
+                )
+            del self._totals[:days_end]
+            del self._status[:days_end]
+            del self._prefix[:days_end]
+            self._prefix[0] = 0.0
+            self._dirty_from = 0
+            self._hours_from -= days_end
+            self._first_day += timedelta(days=days_end)
+
+        for month in [month for month in self._months if month < months_before]:
+            del self._months[month]
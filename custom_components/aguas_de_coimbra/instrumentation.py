@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import math
+from bisect import bisect_left
+from collections import Counter, deque
+
+from .const import LATENCY_BUCKETS, REFRESH_HISTORY_SIZE
+
+
+def _percentile(values: list[float], percentile: float) -> float | None:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    rank = max(math.ceil(percentile / 100 * len(ordered)) - 1, 0)
+    return ordered[min(rank, len(ordered) - 1)]
+
+
+class AdCEndpointStats:
+    """Counters of the requests made to one portal endpoint."""
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.errors: Counter[str] = Counter()
+        # Requests per latency bucket, the last one is for slower requests
+        self.latency = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_total = 0.0
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def as_dict(self) -> dict:
+        lookups = self.cache_hits + self.cache_misses
+        return {
+            "calls": self.calls,
+            "errors": dict(self.errors),
+            "latency_buckets": {
+                **{
+                    f"le_{bound}s": count
+                    for bound, count in zip(LATENCY_BUCKETS, self.latency)
+                },
+                "slower": self.latency[-1],
+            },
+            "latency_average": self.latency_total / self.calls if self.calls else None,
+            "bytes_received": self.bytes_received,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses,
+            "cache_hit_rate": self.cache_hits / lookups if lookups else None,
+        }
+
+
+class AdCClientStats:
+    """Request and refresh instrumentation of an account, kept in memory."""
+
+    def __init__(self) -> None:
+        self.endpoints: dict[str, AdCEndpointStats] = {}
+        # Durations in seconds of the last refreshes of each tier
+        self.refreshes: dict[str, deque[float]] = {}
+
+    def endpoint(self, name: str) -> AdCEndpointStats:
+        if name not in self.endpoints:
+            self.endpoints[name] = AdCEndpointStats()
+        return self.endpoints[name]
+
+    def record_call(self, name: str, seconds: float, size: int) -> None:
+        """Record a request that got an answer."""
+        stats = self.endpoint(name)
+        stats.calls += 1
+        stats.latency[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        stats.latency_total += seconds
+        stats.bytes_received += size
+
+    def record_error(self, name: str, error: Exception) -> None:
+        self.endpoint(name).errors[type(error).__name__] += 1
+
+    def record_cache(self, name: str, hit: bool) -> None:
+        stats = self.endpoint(name)
+        if hit:
+            stats.cache_hits += 1
+        else:
+            stats.cache_misses += 1
+
+    def record_refresh(self, tier: str, seconds: float) -> None:
+        if tier not in self.refreshes:
+            self.refreshes[tier] = deque(maxlen=REFRESH_HISTORY_SIZE)
+        self.refreshes[tier].append(seconds)
+
+    @property
+    def total_calls(self) -> int:
+        return sum(stats.calls for stats in self.endpoints.values())
+
+    def refresh_p95(self) -> float | None:
+        """95th percentile duration of the recent refreshes of every tier."""
+        return _percentile(
+            [seconds for tier in self.refreshes.values() for seconds in tier], 95
+        )
+
+    def as_dict(self) -> dict:
+        return {
+            "endpoints": {
+                name: stats.as_dict() for name, stats in self.endpoints.items()
+            },
+            "refreshes": {
+                tier: {
+                    "count": len(durations),
+                    "last": durations[-1] if durations else None,
+                    "p50": _percentile(list(durations), 50),
+                    "p95": _percentile(list(durations), 95),
+                }
+                for tier, durations in self.refreshes.items()
+            },
+        }
@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+from datetime import date, datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    LEAK_BASELINE_SMOOTHING,
+    LEAK_CONTINUOUS_HOURS,
+    LEAK_NIGHT_FLOW,
+    LEAK_NIGHT_HOURS,
+    LEAK_WARMUP_HOURS,
+)
+from .history import HOURS_PER_DAY, AdCUsageHistory
+
+
+class AdCLeakDetector:
+    """Watch the hourly consumption of a meter for signs of a leak.
+
+    Each published hour is read once, in order, and updates a few running
+    values: the hours in a row with consumption, the minimum flow of the
+    current and last night, and an exponential moving average of the hourly
+    flow used as a baseline. A leak is reported when water flows for
+    LEAK_CONTINUOUS_HOURS in a row, or when it never stops overnight.
+    """
+
+    def __init__(self) -> None:
+        # Next hour to read, as a local day and hour of the day
+        self._next_day: date | None = None
+        self._next_hour = 0
+        self.flow = 0.0
+        self.consecutive_hours = 0
+        self.baseline: float | None = None
+        self._night_min: float | None = None
+        self.last_night_min: float | None = None
+
+    def export_state(self) -> dict:
+        """Return the running values saved in the persistent cache."""
+        return {
+            "next_day": self._next_day.isoformat() if self._next_day else None,
+            "next_hour": self._next_hour,
+            "flow": self.flow,
+            "consecutive_hours": self.consecutive_hours,
+            "baseline": self.baseline,
+            "night_min": self._night_min,
+            "last_night_min": self.last_night_min,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the running values saved by export_state."""
+        if state.get("next_day"):
+            self._next_day = dt_util.parse_date(state["next_day"])
+        self._next_hour = state.get("next_hour", 0)
+        self.flow = state.get("flow", 0.0)
+        self.consecutive_hours = state.get("consecutive_hours", 0)
+        self.baseline = state.get("baseline")
+        self._night_min = state.get("night_min")
+        self.last_night_min = state.get("last_night_min")
+
+    @property
+    def leak(self) -> bool:
+        return self.consecutive_hours >= LEAK_CONTINUOUS_HOURS or (
+            self.last_night_min is not None and self.last_night_min >= LEAK_NIGHT_FLOW
+        )
+
+    @property
+    def attributes(self) -> dict:
+        """Flow values shown with the leak sensor, in litres per hour."""
+        return {
+            "flow_rate": self.flow,
+            "consecutive_flow_hours": self.consecutive_hours,
+            "night_minimum_flow": self.last_night_min,
+            "baseline_flow": None
+            if self.baseline is None
+            else round(self.baseline, 2),
+            "baseline_deviation": None
+            if self.baseline is None
+            else round(self.flow - self.baseline, 2),
+        }
+
+    def update(
+        self, history: AdCUsageHistory, newest_reading: datetime | None
+    ) -> None:
+        """Read every hour published since the last update."""
+        if newest_reading is None:
+            return
+        newest = dt_util.as_local(newest_reading)
+        start = newest - timedelta(hours=LEAK_WARMUP_HOURS)
+        if self._next_day is None or self._next_day < start.date():
+            # First run or a long outage, only the recent hours matter
+            self._next_day, self._next_hour = start.date(), start.hour
+
+        while (self._next_day, self._next_hour) <= (newest.date(), newest.hour):
+            hours = history.hours(self._next_day)
+            if hours is not None:
+                self._observe(self._next_hour, hours[self._next_hour])
+            self._next_hour += 1
+            if self._next_hour == HOURS_PER_DAY:
+                self._next_day += timedelta(days=1)
+                self._next_hour = 0
+
+    def _observe(self, hour: int, litres: float) -> None:
+        """Update the running values with one hour of consumption."""
+        self.flow = litres
+        self.consecutive_hours = self.consecutive_hours + 1 if litres > 0 else 0
+        if self.baseline is None:
+            self.baseline = litres
+        else:
+            self.baseline += (litres - self.baseline) * LEAK_BASELINE_SMOOTHING
+
+        first_hour, last_hour = LEAK_NIGHT_HOURS
+        if first_hour <= hour <= last_hour:
+            self._night_min = (
+                litres if self._night_min is None else min(self._night_min, litres)
+            )
+            if hour == last_hour:
+                self.last_night_min = self._night_min
+                self._night_min = None
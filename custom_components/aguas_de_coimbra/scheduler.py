@@ -0,0 +1,86 @@
+from __future__ import annotations
+
+import logging
+from datetime import datetime, timedelta
+
+from homeassistant.util import dt as dt_util
+
+from .const import (
+    ADAPTIVE_DEFAULT_LAG,
+    ADAPTIVE_LAG_SMOOTHING,
+    ADAPTIVE_MAX_INTERVAL,
+    ADAPTIVE_MIN_INTERVAL,
+    ADAPTIVE_POLL_MARGIN,
+    FAST_UPDATE_INTERVAL,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdCPollScheduler:
+    """Plan the next poll from the portal's observed publication lag.
+
+    Each hourly reading covers one hour and shows up on the portal some time
+    after that hour ends. The lag is estimated with an exponential moving
+    average whenever a newer reading appears, and the next poll is planned
+    just after the following reading is expected. When nothing new shows up
+    the interval doubles, up to ADAPTIVE_MAX_INTERVAL. Without reading
+    timestamps there is nothing to plan from, and polls keep the fixed
+    FAST_UPDATE_INTERVAL.
+    """
+
+    def __init__(self) -> None:
+        self._newest_reading: datetime | None = None
+        self._lag = ADAPTIVE_DEFAULT_LAG
+        self._misses = 0
+        # Whether the last refresh found a reading timestamp
+        self._timestamped = False
+
+    def export_state(self) -> dict:
+        """Return the state saved in the persistent cache."""
+        return {
+            "newest_reading": self._newest_reading.isoformat()
+            if self._newest_reading
+            else None,
+            "lag": self._lag.total_seconds(),
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the state saved by export_state."""
+        if state.get("newest_reading"):
+            self._newest_reading = dt_util.parse_datetime(state["newest_reading"])
+        if state.get("lag") is not None:
+            self._lag = timedelta(seconds=state["lag"])
+
+    def observe(self, newest_reading: datetime | None) -> None:
+        """Record the newest hourly reading seen in a refresh."""
+        self._timestamped = newest_reading is not None
+        if newest_reading is None:
+            return
+        if self._newest_reading is not None and newest_reading <= self._newest_reading:
+            self._misses += 1
+            return
+
+        # The reading covers the hour that starts at its timestamp
+        lag = dt_util.now() - (newest_reading + timedelta(hours=1))
+        if self._newest_reading is not None and lag >= timedelta(0):
+            self._lag += (lag - self._lag) * ADAPTIVE_LAG_SMOOTHING
+            _LOGGER.debug("Estimated publication lag is now %s", self._lag)
+        self._newest_reading = newest_reading
+        self._misses = 0
+
+    def next_interval(self) -> timedelta:
+        """Time until the next poll."""
+        if not self._timestamped:
+            return FAST_UPDATE_INTERVAL
+        now = dt_util.now()
+        if self._newest_reading is not None:
+            expected = self._newest_reading + timedelta(hours=2) + self._lag
+            if expected > now and self._misses == 0:
+                return min(
+                    max(expected - now + ADAPTIVE_POLL_MARGIN, ADAPTIVE_MIN_INTERVAL),
+                    ADAPTIVE_MAX_INTERVAL,
+                )
+
+        # Overdue or unknown, back off until something new shows up
+        return min(ADAPTIVE_MIN_INTERVAL * 2**self._misses, ADAPTIVE_MAX_INTERVAL)
@@ -1,30 +1,35 @@
 from homeassistant.components.sensor import (
+    RestoreSensor,
     SensorDeviceClass,
-    SensorEntity,
     SensorStateClass,
 )
-from homeassistant.const import CURRENCY_EURO, UnitOfVolume
+from homeassistant.const import CURRENCY_EURO, UnitOfTime, UnitOfVolume
+from homeassistant.core import callback
 from homeassistant.helpers.device_registry import DeviceInfo
 from homeassistant.helpers.entity import EntityCategory
 from homeassistant.helpers.update_coordinator import CoordinatorEntity
 
-from .const import DOMAIN
-from .coordinator import AdCCoordinator
+from .adc_client import AdCMeter
+from .const import DOMAIN, TIER_DAILY, TIER_FAST, TIER_SLOW
+from .coordinator import AdCCoordinator, AdCTierCoordinator
 
 SENSOR_TYPES = {
     "today_consumption": {
+        "tier": TIER_FAST,
         "name": "Today's Consumption",
         "unit": UnitOfVolume.LITERS,
         "icon": "mdi:water",
         "device_class": SensorDeviceClass.WATER,
     },
     "yesterday_consumption": {
+        "tier": TIER_DAILY,
         "name": "Yesterday's Consumption",
         "unit": UnitOfVolume.LITERS,
         "icon": "mdi:water",
         "device_class": SensorDeviceClass.WATER,
     },
     "meter_reading": {
+        "tier": TIER_DAILY,
         "name": "Meter Reading",
         "unit": UnitOfVolume.CUBIC_METERS,
         "icon": "mdi:gauge",
@@ -32,64 +37,179 @@ SENSOR_TYPES = {
         "state_class": SensorStateClass.TOTAL_INCREASING,
     },
     "billing_cycle_consumption": {
+        "tier": TIER_SLOW,
         "name": "Billing Cycle Consumption",
         "unit": UnitOfVolume.CUBIC_METERS,
         "icon": "mdi:water",
         "device_class": "water",
     },
     "billing_cycle_cost": {
+        "tier": TIER_SLOW,
         "name": "Billing Cycle Cost",
         "unit": CURRENCY_EURO,
         "icon": "mdi:cash",
         "device_class": SensorDeviceClass.MONETARY,
     },
+    "projected_cycle_consumption": {
+        "tier": TIER_SLOW,
+        "name": "Projected Billing Cycle Consumption",
+        "unit": UnitOfVolume.CUBIC_METERS,
+        "icon": "mdi:water-outline",
+        "device_class": SensorDeviceClass.WATER,
+        "attributes": "forecast_details",
+    },
+    "projected_cycle_cost": {
+        "tier": TIER_SLOW,
+        "name": "Projected Billing Cycle Cost",
+        "unit": CURRENCY_EURO,
+        "icon": "mdi:cash-clock",
+        "device_class": SensorDeviceClass.MONETARY,
+        "attributes": "forecast_details",
+    },
     "last_successful_refresh": {
+        "tier": TIER_FAST,
         "name": "Last Successful Refresh",
         "unit": None,
         "icon": "mdi:clock",
         "device_class": SensorDeviceClass.TIMESTAMP,
         "entity_category": EntityCategory.DIAGNOSTIC,
     },
+    # Account wide instrumentation, disabled unless enabled by the user
+    "refresh_duration_p95": {
+        "tier": TIER_FAST,
+        "name": "Refresh Duration (p95)",
+        "unit": UnitOfTime.SECONDS,
+        "icon": "mdi:timer-outline",
+        "device_class": SensorDeviceClass.DURATION,
+        "entity_category": EntityCategory.DIAGNOSTIC,
+        "primary_only": True,
+        "enabled_default": False,
+    },
+    "portal_requests": {
+        "tier": TIER_FAST,
+        "name": "Portal Requests",
+        "unit": None,
+        "icon": "mdi:swap-vertical",
+        "state_class": SensorStateClass.TOTAL_INCREASING,
+        "entity_category": EntityCategory.DIAGNOSTIC,
+        "primary_only": True,
+        "enabled_default": False,
+    },
+    "portal_logins": {
+        "tier": TIER_FAST,
+        "name": "Portal Logins",
+        "unit": None,
+        "icon": "mdi:login",
+        "state_class": SensorStateClass.TOTAL_INCREASING,
+        "entity_category": EntityCategory.DIAGNOSTIC,
+        "primary_only": True,
+        "enabled_default": False,
+    },
 }
 
 
 async def async_setup_entry(hass, entry, async_add_entities):
     """Set up ADC sensors based on a config entry."""
     coordinator: AdCCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    added_meters: set[str] = set()
+
+    @callback
+    def async_add_meter_sensors() -> None:
+        """Add a sensor set for every meter not seen before."""
+        sensors = []
+        for meter_id, meter in coordinator.client.meters.items():
+            if meter_id in added_meters:
+                continue
+            added_meters.add(meter_id)
+            # Each sensor only listens to the tier that refreshes its value
+            sensors.extend(
+                ADCSensor(
+                    coordinator.tiers[sensor["tier"]],
+                    meter,
+                    key,
+                    coordinator.unique_id_prefix(entry.entry_id, meter_id),
+                    meter_id == coordinator.primary_meter_id,
+                )
+                for key, sensor in SENSOR_TYPES.items()
+                if meter_id == coordinator.primary_meter_id
+                or not sensor.get("primary_only")
+            )
+        if sensors:
+            async_add_entities(sensors)
 
-    sensors = [ADCSensor(coordinator, key, entry.entry_id) for key in SENSOR_TYPES]
-    async_add_entities(sensors)
+    async_add_meter_sensors()
+    # Meters found by later refreshes get their sensors then
+    for tier in coordinator.tiers.values():
+        entry.async_on_unload(tier.async_add_listener(async_add_meter_sensors))
 
 
-class ADCSensor(CoordinatorEntity, SensorEntity):
-    """Sensor for Águas de Coimbra data."""
+class ADCSensor(CoordinatorEntity, RestoreSensor):
+    """Sensor for the data of one Águas de Coimbra meter."""
 
-    def __init__(self, coordinator: AdCCoordinator, sensor_type: str, entry_id: str):
+    def __init__(
+        self,
+        coordinator: AdCTierCoordinator,
+        meter: AdCMeter,
+        sensor_type: str,
+        unique_id_prefix: str,
+        primary: bool,
+    ):
         super().__init__(coordinator)
         self.type = sensor_type
-        self.entry_id = entry_id
+        self.meter_id = meter.meter_id
         self._attr_name = f"{SENSOR_TYPES[sensor_type]['name']}"
-        self._attr_unique_id = f"{entry_id}_{sensor_type}"
+        self._attr_unique_id = f"{unique_id_prefix}_{sensor_type}"
         self._attr_native_unit_of_measurement = SENSOR_TYPES[sensor_type]["unit"]
         self._attr_icon = SENSOR_TYPES[sensor_type]["icon"]
         self._attr_has_entity_name = True
         self._attr_device_class = SENSOR_TYPES[sensor_type].get("device_class")
         self._attr_state_class = SENSOR_TYPES[sensor_type].get("state_class")
         self._attr_entity_category = SENSOR_TYPES[sensor_type].get("entity_category")
-        self.entity_id = f"sensor.{DOMAIN}_{sensor_type}"
-
-    @property
-    def device_info(self) -> DeviceInfo:
-        return DeviceInfo(
-            identifiers={(DOMAIN, "aguas_de_coimbra")},
-            name="Águas de Coimbra",
+        self._attr_entity_registry_enabled_default = SENSOR_TYPES[sensor_type].get(
+            "enabled_default", True
+        )
+        self._attr_device_info = DeviceInfo(
+            identifiers={(DOMAIN, unique_id_prefix)},
+            name="Águas de Coimbra"
+            if primary
+            else f"Águas de Coimbra {meter.numero_contador}",
             manufacturer="Águas de Coimbra",
             entry_type="service",
         )
+        self._restored_value = None
+        self._written_stale = None
+        self._attributes_key = SENSOR_TYPES[sensor_type].get("attributes")
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        # Without a cached snapshot, show the last state until the first refresh
+        last_data = await self.async_get_last_sensor_data()
+        if last_data is not None:
+            self._restored_value = last_data.native_value
 
     @property
     def native_value(self):
-        return self.coordinator.data.get(self.type)
+        values = (self.coordinator.data or {}).get(self.meter_id, {})
+        if self.type not in values:
+            return self._restored_value
+        return values[self.type]
+
+    @property
+    def extra_state_attributes(self) -> dict:
+        attributes = {}
+        if "attributes" in SENSOR_TYPES[self.type]:
+            values = (self.coordinator.data or {}).get(self.meter_id, {})
+            attributes.update(values.get(SENSOR_TYPES[self.type]["attributes"], {}))
+        # Restored values are stale until the first live refresh
+        attributes["stale"] = self.coordinator.stale
+        return attributes
 
     def _handle_coordinator_update(self) -> None:
+        # Only the values changed by the refresh cause state writes
+        if self.coordinator.stale == self._written_stale and not (
+            {(self.meter_id, self.type), (self.meter_id, self._attributes_key)}
+            & self.coordinator.changed
+        ):
+            return
+        self._written_stale = self.coordinator.stale
         super()._handle_coordinator_update()
@@ -0,0 +1,251 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from pathlib import Path
+
+import voluptuous as vol
+from homeassistant.core import (
+    HomeAssistant,
+    ServiceCall,
+    ServiceResponse,
+    SupportsResponse,
+)
+from homeassistant.exceptions import HomeAssistantError
+from homeassistant.helpers import config_validation as cv
+from homeassistant.util import dt as dt_util
+
+from .adc_client import AdCMeter
+from .const import (
+    DOMAIN,
+    EXPORT_DIRECTORY,
+    EXPORT_FORMATS,
+    STATISTICS_BACKFILL_MAX_DAYS,
+)
+from .export import AdCUsageExport
+from .tariff import calculate_costs
+
+SERVICE_COMPUTE_USAGE = "compute_usage"
+SERVICE_EXPORT_USAGE = "export_usage"
+
+GROUP_BY = ("day", "cycle", "month")
+
+COMPUTE_USAGE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("config_entry_id"): cv.string,
+        vol.Optional("meter"): cv.string,
+        vol.Required("start_date"): cv.date,
+        vol.Required("end_date"): cv.date,
+        vol.Optional("group_by", default="cycle"): vol.In(GROUP_BY),
+    }
+)
+
+EXPORT_USAGE_SCHEMA = vol.Schema(
+    {
+        vol.Optional("config_entry_id"): cv.string,
+        vol.Optional("meter"): cv.string,
+        vol.Required("start_date"): cv.date,
+        vol.Required("end_date"): cv.date,
+        vol.Optional("format", default="csv"): vol.In(EXPORT_FORMATS),
+        vol.Optional("filename"): cv.string,
+    }
+)
+
+
+def _next_month(day: date) -> date:
+    """The same day of the following month, for days up to the 28th."""
+    if day.month == 12:
+        return day.replace(year=day.year + 1, month=1)
+    return day.replace(month=day.month + 1)
+
+
+def _previous_month(day: date) -> date:
+    """The same day of the previous month, for days up to the 28th."""
+    if day.month == 1:
+        return day.replace(year=day.year - 1, month=12)
+    return day.replace(month=day.month - 1)
+
+
+def _buckets(
+    start_date: date, end_date: date, group_by: str, cycle_start_day: int
+) -> list[tuple[date, date]]:
+    """Split a range of days into days, calendar months or billing cycles.
+
+    The first and last buckets are clipped to the range.
+    """
+    buckets = []
+    day = start_date
+    while day <= end_date:
+        if group_by == "day":
+            bucket_end = day
+        elif group_by == "month":
+            bucket_end = _next_month(day.replace(day=1)) - timedelta(days=1)
+        else:
+            cycle_start = day.replace(day=cycle_start_day)
+            if day < cycle_start:
+                cycle_start = _previous_month(cycle_start)
+            bucket_end = _next_month(cycle_start) - timedelta(days=1)
+        bucket_end = min(bucket_end, end_date)
+        buckets.append((day, bucket_end))
+        day = bucket_end + timedelta(days=1)
+    return buckets
+
+
+def _find_meter(hass: HomeAssistant, call: ServiceCall) -> AdCMeter:
+    """The meter asked for, or the primary meter of the only or given account."""
+    domain_data = hass.data.get(DOMAIN, {})
+    entry_id = call.data.get("config_entry_id")
+    if entry_id is None:
+        # Entries of the same account share a coordinator
+        accounts = list(domain_data.get("accounts", {}).values())
+        if len(accounts) != 1:
+            raise HomeAssistantError(
+                "Several accounts are set up, give config_entry_id"
+            )
+        coordinator = accounts[0]["coordinator"]
+    else:
+        entry = hass.config_entries.async_get_entry(entry_id)
+        if entry is None or entry.domain != DOMAIN or entry_id not in domain_data:
+            raise HomeAssistantError(f"Unknown config entry {entry_id}")
+        coordinator = domain_data[entry_id]["coordinator"]
+
+    meter_key = call.data.get("meter", coordinator.primary_meter_id)
+    for meter_id, meter in coordinator.client.meters.items():
+        if meter_key in (meter_id, meter.numero_contador):
+            return meter
+    raise HomeAssistantError(f"Unknown meter {meter_key}")
+
+
+def _date_range(
+    call: ServiceCall, max_days: int | None = None
+) -> tuple[date, date]:
+    """The start and end dates of a call, checked."""
+    start_date: date = call.data["start_date"]
+    end_date: date = call.data["end_date"]
+    if end_date < start_date:
+        raise HomeAssistantError("end_date is before start_date")
+    if end_date > dt_util.now().date():
+        # Future days would be stored as open days without consumption
+        raise HomeAssistantError("end_date is in the future")
+    if max_days is not None and (end_date - start_date).days >= max_days:
+        raise HomeAssistantError(f"Ranges are limited to {max_days} days")
+    return start_date, end_date
+
+
+async def _async_compute_usage(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Volume and cost breakdown of every bucket of a range of days."""
+    # The readings of the whole range are kept in the usage history
+    start_date, end_date = _date_range(call, STATISTICS_BACKFILL_MAX_DAYS)
+    meter = _find_meter(hass, call)
+    client = meter._client
+    # Only the days missing from the history are fetched
+    await meter.load_usage(start_date, end_date)
+
+    periods = _buckets(
+        start_date, end_date, call.data["group_by"], client.billing_cycle_start_day
+    )
+    volumes = [
+        meter.history.total(bucket_start, bucket_end) / 1000
+        for bucket_start, bucket_end in periods
+    ]
+    # Each bucket is priced as a billing period of its own length
+    costs = calculate_costs(
+        (
+            volume,
+            (bucket_end - bucket_start).days + 1,
+            meter.diameter,
+            client.social_tariff,
+            bucket_start,
+        )
+        for (bucket_start, bucket_end), volume in zip(periods, volumes)
+    )
+
+    buckets = []
+    totals: dict[str, float] = {}
+    for (bucket_start, bucket_end), volume, cost in zip(periods, volumes, costs):
+        for key, value in {"volume": volume, **cost}.items():
+            totals[key] = totals.get(key, 0) + value
+        buckets.append(
+            {
+                "start": bucket_start.isoformat(),
+                "end": bucket_end.isoformat(),
+                "days": (bucket_end - bucket_start).days + 1,
+                "volume": round(volume, 3),
+                # Only part of a rolled up billing month, its share of the total
+                "estimated": meter.history.is_estimate(bucket_start, bucket_end),
+                "cost": {key: round(value, 2) for key, value in cost.items()},
+            }
+        )
+
+    return {
+        "meter": meter.numero_contador,
+        "group_by": call.data["group_by"],
+        "buckets": buckets,
+        "total": {
+            "volume": round(totals.pop("volume", 0), 3),
+            "cost": {key: round(value, 2) for key, value in totals.items()},
+        },
+    }
+
+
+async def _async_export_usage(
+    hass: HomeAssistant, call: ServiceCall
+) -> ServiceResponse:
+    """Write the hourly readings of a range of days under the config directory."""
+    start_date, end_date = _date_range(call)
+    meter = _find_meter(hass, call)
+    export_format = call.data["format"]
+    filename = call.data.get(
+        "filename",
+        f"{meter.numero_contador or meter.meter_id}_{start_date}_{end_date}"
+        f".{export_format}",
+    )
+    if Path(filename).name != filename or filename.startswith("."):
+        raise HomeAssistantError(f"Invalid export file name {filename}")
+
+    path = Path(hass.config.path(EXPORT_DIRECTORY, filename))
+    running = hass.data.setdefault(f"{DOMAIN}_exports", set())
+    if path in running:
+        raise HomeAssistantError(f"{filename} is already being exported")
+    running.add(path)
+    try:
+        return await AdCUsageExport(
+            hass, meter, start_date, end_date, export_format, path
+        ).async_run()
+    finally:
+        running.discard(path)
+
+
+def async_setup_services(hass: HomeAssistant) -> None:
+    """Register the services of the integration, once."""
+    if hass.services.has_service(DOMAIN, SERVICE_COMPUTE_USAGE):
+        return
+
+    async def async_compute_usage(call: ServiceCall) -> ServiceResponse:
+        return await _async_compute_usage(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_COMPUTE_USAGE,
+        async_compute_usage,
+        schema=COMPUTE_USAGE_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+    async def async_export_usage(call: ServiceCall) -> ServiceResponse:
+        return await _async_export_usage(hass, call)
+
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_EXPORT_USAGE,
+        async_export_usage,
+        schema=EXPORT_USAGE_SCHEMA,
+        supports_response=SupportsResponse.OPTIONAL,
+    )
+
+
+def async_unload_services(hass: HomeAssistant) -> None:
+    """Remove the services once the last entry is unloaded."""
+    hass.services.async_remove(DOMAIN, SERVICE_COMPUTE_USAGE)
+    hass.services.async_remove(DOMAIN, SERVICE_EXPORT_USAGE)
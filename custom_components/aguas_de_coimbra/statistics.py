@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections.abc import Callable
+from datetime import date, timedelta
+
+from homeassistant.components.recorder.models import StatisticData, StatisticMetaData
+from homeassistant.components.recorder.statistics import async_add_external_statistics
+from homeassistant.const import UnitOfVolume
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.util import dt as dt_util
+
+from .adc_client import AdCMeter
+from .const import (
+    DOMAIN,
+    STATISTICS_BACKFILL_CHUNK_DAYS,
+    STATISTICS_BACKFILL_DELAY,
+    STATISTICS_BACKFILL_MAX_DAYS,
+)
+
+_LOGGER = logging.getLogger(__name__)
+
+
+class AdCStatisticsImporter:
+    """Import hourly consumption into the recorder long-term statistics.
+
+    History is first walked back in bounded chunks until the portal has no
+    more data. Hours are then imported oldest first, and a cursor (last
+    imported day and running sum) makes each later run append only new hours.
+    """
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        meter: AdCMeter,
+        statistic_id: str,
+        save_cache: Callable[[], None],
+    ) -> None:
+        self._hass = hass
+        self._meter = meter
+        self._save_cache = save_cache
+        self._task: asyncio.Task | None = None
+        self.statistic_id = statistic_id
+
+        # Oldest day fetched while walking back through history
+        self._backfill_day: date | None = None
+        self._backfill_done = False
+        # Last day imported into the recorder and the sum at its end
+        self._imported_day: date | None = None
+        self._sum = 0
+
+    def export_state(self) -> dict:
+        """Return the cursor saved in the persistent cache."""
+        return {
+            "backfill_day": self._backfill_day.isoformat()
+            if self._backfill_day
+            else None,
+            "backfill_done": self._backfill_done,
+            "imported_day": self._imported_day.isoformat()
+            if self._imported_day
+            else None,
+            "sum": self._sum,
+            "statistic_id": self.statistic_id,
+        }
+
+    def restore_state(self, state: dict) -> None:
+        """Restore the cursor saved by export_state."""
+        if state.get("backfill_day"):
+            self._backfill_day = dt_util.parse_date(state["backfill_day"])
+        self._backfill_done = state.get("backfill_done", False)
+        if state.get("imported_day"):
+            self._imported_day = dt_util.parse_date(state["imported_day"])
+        self._sum = state.get("sum", 0)
+        self.statistic_id = state.get("statistic_id", self.statistic_id)
+
+    @property
+    def next_day(self) -> date | None:
+        """First day whose hours are still to be imported, if known."""
+        if self._imported_day is not None:
+            return self._imported_day + timedelta(days=1)
+        return self._backfill_day
+
+    @callback
+    def async_schedule_import(self) -> None:
+        """Start an import run unless one is already in progress."""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = self._hass.async_create_background_task(
+            self._async_import(),
+            f"{DOMAIN} statistics import {self._meter.meter_id}",
+        )
+
+    @callback
+    def async_cancel(self) -> None:
+        """Stop an import run in progress."""
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _async_import(self) -> None:
+        """Backfill the history if needed and import the new hours."""
+        try:
+            if not self._backfill_done:
+                await self._async_backfill()
+            await self._async_load_new_hours()
+            self._import_new_hours()
+        except Exception as err:
+            _LOGGER.warning("Failed to import consumption statistics: %s", err)
+
+    async def _async_backfill(self) -> None:
+        """Walk back through history one chunk at a time."""
+        today = dt_util.now().date()
+        oldest_day = today - timedelta(days=STATISTICS_BACKFILL_MAX_DAYS)
+        if self._backfill_day is None:
+            self._backfill_day = today
+
+        while self._backfill_day > oldest_day:
+            final_day = self._backfill_day - timedelta(days=1)
+            initial_day = max(
+                oldest_day,
+                final_day - timedelta(days=STATISTICS_BACKFILL_CHUNK_DAYS - 1),
+            )
+            consumption = await self._meter.load_usage(initial_day, final_day)
+            self._backfill_day = initial_day
+            self._save_cache()
+
+            if consumption == 0:
+                # A whole chunk without consumption, history starts here
+                break
+            # Rate limit the backfill requests
+            await asyncio.sleep(STATISTICS_BACKFILL_DELAY)
+
+        self._backfill_done = True
+        self._save_cache()
+
+    async def _async_load_new_hours(self) -> None:
+        """Fetch the days after the cursor that are missing or still open.
+
+        The tiers only refresh the current billing cycle, so days left behind
+        while Home Assistant was down would otherwise stall the cursor.
+        """
+        next_day = self.next_day
+        yesterday = dt_util.now().date() - timedelta(days=1)
+        if next_day is not None and next_day <= yesterday:
+            await self._meter.load_usage(next_day, yesterday, refresh_open=True)
+
+    def _import_new_hours(self) -> None:
+        """Import the hours of the final days after the cursor."""
+        day = (
+            self._imported_day + timedelta(days=1)
+            if self._imported_day
+            else self._backfill_day
+        )
+
+        statistics: list[StatisticData] = []
+        while (hours := self._meter.get_final_usage_hours(day)) is not None:
+            start = dt_util.as_utc(dt_util.start_of_local_day(day))
+            for hour, consumption in enumerate(hours):
+                self._sum += consumption
+                statistics.append(
+                    StatisticData(
+                        start=start + timedelta(hours=hour),
+                        state=consumption,
+                        sum=self._sum,
+                    )
+                )
+            self._imported_day = day
+            day += timedelta(days=1)
+
+        if not statistics:
+            return
+
+        name = f"Águas de Coimbra {self._meter.numero_contador} hourly consumption"
+        metadata = StatisticMetaData(
+            has_mean=False,
+            has_sum=True,
+            name=name,
+            source=DOMAIN,
+            statistic_id=self.statistic_id,
+            unit_of_measurement=UnitOfVolume.LITERS,
+        )
+        async_add_external_statistics(self._hass, metadata, statistics)
+        _LOGGER.debug("Imported %s hours of consumption statistics", len(statistics))
+        self._save_cache()
@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from datetime import date
+
+from homeassistant.util import dt as dt_util
+
+from .const import TARIFF_VERSIONS
+
+
+class _TieredPrice:
+    """A tiered price table compiled into cumulative breakpoint arrays."""
+
+    def __init__(self, tiers: list[dict]) -> None:
+        # Upper bound of each tier, the price inside it and the cost of
+        # consuming everything below its lower bound
+        self.breakpoints = [tier["max"] for tier in tiers]
+        self.prices = [tier["price"] for tier in tiers]
+        self.cumulative = [0.0]
+        for tier in tiers[:-1]:
+            self.cumulative.append(
+                self.cumulative[-1] + tier["price"] * (tier["max"] - tier["min"])
+            )
+        self.minimums = [tier["min"] for tier in tiers]
+
+    def cost(self, consumption: float) -> float:
+        """Cost of a consumption, found in O(log n) tiers."""
+        if consumption <= 0:
+            return 0
+        tier = self.tier(consumption)
+        return self.cumulative[tier] + self.prices[tier] * (
+            consumption - self.minimums[tier]
+        )
+
+    def tier(self, consumption: float) -> int:
+        """Index of the tier a consumption falls in."""
+        return min(bisect_left(self.breakpoints, consumption), len(self.prices) - 1)
+
+
+class CompiledTariff:
+    """One tariff version, compiled once for fast pricing."""
+
+    def __init__(self, version: dict) -> None:
+        self.effective_date: date = version["effective_date"]
+        self.version = version
+        self.water_consumption = _TieredPrice(version["water_consumption"])
+        self.water_consumption__social_tariff = _TieredPrice(
+            version["water_consumption__social_tariff"]
+        )
+        self._fixed_fee_minimums = [fee["min"] for fee in version["water_fixed_fee"]]
+        self._fixed_fee_prices = [fee["price"] for fee in version["water_fixed_fee"]]
+
+    def water_table(self, social_tariff: bool) -> _TieredPrice:
+        """The tiered water consumption prices that apply."""
+        if social_tariff:
+            return self.water_consumption__social_tariff
+        return self.water_consumption
+
+    def water_consumption_cost(
+        self, consumption_m3: float, social_tariff: bool = False
+    ) -> float:
+        return self.water_table(social_tariff).cost(consumption_m3)
+
+    def water_fixed_fee_cost(
+        self, days_in_cycle: int, social_tariff: bool = False, diameter: int = 15
+    ) -> float:
+        if social_tariff:
+            return self.version["water_fixed_fee__social_tariff"] * days_in_cycle
+        index = bisect_right(self._fixed_fee_minimums, diameter) - 1
+        return self._fixed_fee_prices[max(index, 0)] * days_in_cycle
+
+    def sewage_cost(
+        self, water_cost: float, days_in_cycle: int, social_tariff: bool = False
+    ) -> float:
+        suffix = "__social_tariff" if social_tariff else ""
+        return (
+            self.version[f"sewage_fixed_fee{suffix}"] * days_in_cycle
+            + self.version[f"sewage_consumption{suffix}"] * water_cost
+        )
+
+    def solid_waste_cost(
+        self, consumption_m3: float, days_in_cycle: int, social_tariff: bool = False
+    ) -> float:
+        suffix = "__social_tariff" if social_tariff else ""
+        return (
+            self.version[f"solid_waste_fixed_fee{suffix}"] * days_in_cycle
+            + self.version[f"solid_waste_consumption{suffix}"] * consumption_m3
+            + self.version["solid_waste_management_tax"] * consumption_m3
+        )
+
+    def taxes_cost(self, consumption_m3: float) -> float:
+        return (
+            self.version["water_resources_tax"] + self.version["sewage_resources_tax"]
+        ) * consumption_m3
+
+    def cost_breakdown(
+        self,
+        consumption_m3: float,
+        days_in_cycle: int,
+        diameter: int = 15,
+        social_tariff: bool = False,
+    ) -> dict:
+        """Cost of a billing cycle per component, VAT included where due."""
+        vat = 1 + self.version["vat_rate"]
+        water = self.water_consumption_cost(consumption_m3, social_tariff)
+        breakdown = {
+            "water": water * vat,
+            "water_fixed_fee": self.water_fixed_fee_cost(
+                days_in_cycle, social_tariff, diameter
+            )
+            * vat,
+            "sewage": self.sewage_cost(water, days_in_cycle, social_tariff) * vat,
+            # Solid waste is exempt from VAT
+            "solid_waste": self.solid_waste_cost(
+                consumption_m3, days_in_cycle, social_tariff
+            ),
+            "taxes": self.taxes_cost(consumption_m3) * vat,
+        }
+        breakdown["total"] = sum(breakdown.values())
+        # VAT share of the components above, already part of the total
+        breakdown["vat"] = (
+            breakdown["total"] - breakdown["solid_waste"]
+        ) * self.version["vat_rate"] / vat
+        return breakdown
+
+    def total_cost(
+        self,
+        consumption_m3: float,
+        days_in_cycle: int,
+        diameter: int = 15,
+        social_tariff: bool = False,
+    ) -> float:
+        """Cost of a billing cycle, VAT included where due."""
+        return self.cost_breakdown(
+            consumption_m3, days_in_cycle, diameter, social_tariff
+        )["total"]
+
+
+# Compiled once, sorted by effective date
+_TARIFFS = sorted(
+    (CompiledTariff(version) for version in TARIFF_VERSIONS),
+    key=lambda tariff: tariff.effective_date,
+)
+_EFFECTIVE_DATES = [tariff.effective_date for tariff in _TARIFFS]
+
+
+def get_tariff(day: date | None = None) -> CompiledTariff:
+    """The tariff in force on a day, today's if no day is given."""
+    if day is None:
+        day = dt_util.now().date()
+    return _TARIFFS[max(bisect_right(_EFFECTIVE_DATES, day) - 1, 0)]
+
+
+def calculate_costs(
+    cycles: Iterable[tuple[float, int, int, bool, date | None]],
+) -> list[dict]:
+    """Price many (consumption_m3, days_in_cycle, diameter, social_tariff, start
+    day) billing cycles in one call, each at the tariff in force on its start day.
+
+    Returns the cost_breakdown of every cycle.
+    """
+    return [
+        get_tariff(day).cost_breakdown(consumption_m3, days, diameter, social_tariff)
+        for consumption_m3, days, diameter, social_tariff, day in cycles
+    ]
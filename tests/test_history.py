@@ -0,0 +1,211 @@
+"""Tests of the usage history levels and their rollups."""
+
+from __future__ import annotations
+
+import importlib.util
+from datetime import date, timedelta
+from pathlib import Path
+
+import pytest
+
+# history.py has no Home Assistant imports, load it without the package
+_SPEC = importlib.util.spec_from_file_location(
+    "adc_history",
+    Path(__file__).parents[1]
+    / "custom_components"
+    / "aguas_de_coimbra"
+    / "history.py",
+)
+history = importlib.util.module_from_spec(_SPEC)
+_SPEC.loader.exec_module(history)
+
+AdCUsageHistory = history.AdCUsageHistory
+
+START = date(2024, 1, 10)
+
+
+def _filled(days: int, litres_per_hour: float = 1.0) -> AdCUsageHistory:
+    """A history of final days from START, litres_per_hour every hour."""
+    usage = AdCUsageHistory()
+    for offset in range(days):
+        hours = [litres_per_hour] * history.HOURS_PER_DAY
+        usage.set_day(START + timedelta(days=offset), sum(hours), hours, True)
+    return usage
+
+
+def _restored(usage: AdCUsageHistory) -> AdCUsageHistory:
+    """A copy made the way AdCMeter saves and restores its history."""
+    copy = AdCUsageHistory()
+    for day, final in usage.days():
+        copy.set_day(day, usage.day_total(day), usage.hours(day), final)
+    for month, litres, mask in usage.months():
+        copy.set_month(month, litres, mask)
+    return copy
+
+
+def test_total_and_hours():
+    usage = _filled(3)
+    assert usage.total(START, START + timedelta(days=2)) == 72
+    assert usage.day_total(START + timedelta(days=1)) == 24
+    assert usage.hours(START) == [1.0] * 24
+    assert usage.total(START - timedelta(days=5), START - timedelta(days=1)) == 0
+
+
+def test_set_day_books_remainder_at_midnight():
+    usage = AdCUsageHistory()
+    usage.set_day(START, 30, [1.0] * 24, False)
+    assert usage.hours(START)[0] == 7
+    assert usage.day_total(START) == 30
+    assert usage.has_day(START)
+    assert not usage.is_final(START)
+    usage.mark_final(START)
+    assert usage.is_final(START)
+    assert usage.hours(START)[0] == 7
+
+
+def test_backfill_prepends_days():
+    usage = _filled(2)
+    older = START - timedelta(days=3)
+    usage.set_day(older, 10, [10.0], True)
+    assert usage.total(older, START + timedelta(days=1)) == 58
+    assert usage.hours(older)[0] == 10
+    assert not usage.has_day(older + timedelta(days=1))
+
+
+def test_compact_hours_keeps_totals():
+    usage = _filled(10)
+    usage.compact(START + timedelta(days=5), date(2000, 1, 1), date(2000, 1, 1))
+    assert usage.hours(START + timedelta(days=4)) is None
+    assert usage.hours(START + timedelta(days=5)) == [1.0] * 24
+    assert usage.total(START, START + timedelta(days=9)) == 240
+    assert usage.is_final(START)
+
+
+def test_compact_months_keeps_exact_totals():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    usage.compact(end, end, date(2000, 1, 1))
+
+    assert [month for month, _, _ in usage.months()] == [
+        date(2024, 1, 1),
+        date(2024, 2, 1),
+        date(2024, 3, 1),
+    ]
+    assert usage.total(START, end) == pytest.approx(2400)
+    # January only covers the 10th to the 31st
+    assert usage.total(date(2024, 1, 1), date(2024, 1, 31)) == pytest.approx(528)
+    assert usage.total(date(2024, 1, 10), date(2024, 1, 20)) == pytest.approx(264)
+    assert usage.total(date(2024, 2, 1), date(2024, 2, 29)) == pytest.approx(696)
+    assert usage.hours(end) == [1.0] * 24
+
+
+def test_rolled_up_days_only_cover_known_days():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    usage.compact(end, end, date(2000, 1, 1))
+
+    assert usage.has_day(START) and usage.is_final(START)
+    assert usage.day_total(START) == pytest.approx(24)
+    # History began on START, the days before it are still unknown
+    before = START - timedelta(days=1)
+    assert not usage.has_day(before)
+    assert not usage.is_final(before)
+    assert not usage.has_day(date(2023, 12, 31))
+
+    # A day fetched later is added to its month, once
+    usage.set_day(before, 50, None, True)
+    assert usage.has_day(before)
+    assert usage.total(date(2024, 1, 1), date(2024, 1, 31)) == pytest.approx(578)
+    usage.set_day(before, 80, None, True)
+    assert usage.total(date(2024, 1, 1), date(2024, 1, 31)) == pytest.approx(578)
+
+
+def test_compact_keeps_days_with_hours():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    # Hours are kept from mid-February, so February is only partly rolled up
+    usage.compact(date(2024, 2, 15), end, date(2000, 1, 1))
+    assert usage.hours(date(2024, 2, 15)) == [1.0] * 24
+    assert usage.total(START, end) == pytest.approx(2400)
+
+    usage.compact(end, end, date(2000, 1, 1))
+    assert usage.total(START, end) == pytest.approx(2400)
+    assert usage.total(date(2024, 2, 1), date(2024, 2, 29)) == pytest.approx(696)
+
+
+def test_compact_drops_old_months():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    usage.compact(end, end, date(2024, 2, 1))
+    assert [month for month, _, _ in usage.months()][0] == date(2024, 2, 1)
+    assert usage.total(START, end) == pytest.approx(2400 - 528)
+    assert not usage.has_day(START)
+
+
+def test_restore_round_trip():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    usage.compact(end - timedelta(days=10), end - timedelta(days=20), date(2000, 1, 1))
+    copy = _restored(usage)
+
+    for initial_day in (START, date(2024, 2, 10), end - timedelta(days=15)):
+        assert copy.total(initial_day, end) == pytest.approx(
+            usage.total(initial_day, end)
+        )
+    assert copy.hours(end) == usage.hours(end)
+    assert copy.hours(end - timedelta(days=15)) is None
+    assert copy.has_day(START) and not copy.has_day(START - timedelta(days=1))
+
+
+def test_months_follow_the_billing_cycle():
+    usage = AdCUsageHistory(15)
+    day = date(2023, 11, 20)
+    while day <= date(2024, 3, 31):
+        usage.set_day(day, day.day, None, True)
+        day += timedelta(days=1)
+    usage.compact(date(2024, 3, 31), date(2024, 3, 20), date(2000, 1, 1))
+
+    assert [month for month, _, _ in usage.months()] == [
+        date(2023, 11, 15),
+        date(2023, 12, 15),
+        date(2024, 1, 15),
+        date(2024, 2, 15),
+    ]
+    # Cycles across the year end and the start of history stay exact
+    december = sum(range(15, 32)) + sum(range(1, 15))
+    assert usage.total(date(2023, 12, 15), date(2024, 1, 14)) == december
+    assert usage.total(date(2023, 11, 15), date(2023, 12, 14)) == sum(
+        range(20, 31)
+    ) + sum(range(1, 15))
+    assert not usage.is_estimate(date(2023, 12, 15), date(2024, 1, 14))
+    assert not usage.is_estimate(date(2023, 11, 10), date(2023, 12, 14))
+
+    # Calendar months cut through the cycles and only get a share
+    assert usage.is_estimate(date(2024, 1, 1), date(2024, 1, 31))
+    assert usage.total(date(2024, 1, 1), date(2024, 1, 14)) == pytest.approx(
+        december * 14 / 31
+    )
+    # Days after the rolled up months are always exact
+    assert not usage.is_estimate(date(2024, 3, 15), date(2024, 3, 31))
+
+
+def test_months_keep_their_start_when_the_cycle_changes():
+    usage = _filled(100)
+    end = START + timedelta(days=99)
+    usage.compact(end, end, date(2000, 1, 1))
+
+    # Restored with another billing cycle start day
+    copy = AdCUsageHistory(15)
+    for day, final in usage.days():
+        copy.set_day(day, usage.day_total(day), usage.hours(day), final)
+    for month, litres, mask in usage.months():
+        copy.set_month(month, litres, mask)
+
+    assert copy.total(START, end) == pytest.approx(2400)
+    assert copy.total(date(2024, 2, 1), date(2024, 2, 29)) == pytest.approx(696)
+    assert copy.is_final(START)
+    assert not copy.has_day(START - timedelta(days=1))
+    # An older day goes to a month of the new cycle
+    copy.set_day(date(2024, 1, 5), 10, None, True)
+    assert copy.has_day(date(2024, 1, 5))
+    assert copy.total(date(2023, 12, 15), date(2024, 1, 9)) == pytest.approx(10)
@@ -0,0 +1,59 @@
+"""Tests of the background token refresh."""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+pytest.importorskip("aiohttp")
+pytest.importorskip("homeassistant")
+
+sys.path.insert(0, str(Path(__file__).parents[1]))
+
+from custom_components.aguas_de_coimbra import adc_client  # noqa: E402
+
+
+async def _logins(lifetime: float, duration: float) -> list[float | None]:
+    """Log in once inside a short refresh deadline and let the refresh run.
+
+    Returns the deadline each login saw.
+    """
+    deadlines: list[float | None] = []
+
+    async def login() -> None:
+        deadlines.append(adc_client._deadline.get())
+        tokens.set(f"token-{len(deadlines)}", time.time() + lifetime)
+
+    tokens = adc_client._TokenManager(login)
+    deadline = adc_client._deadline.set(time.monotonic() + 0.05)
+    try:
+        await tokens.get()
+    finally:
+        adc_client._deadline.reset(deadline)
+    await asyncio.sleep(duration)
+    tokens.cancel()
+    return deadlines
+
+
+def test_refresh_ignores_the_login_deadline(monkeypatch):
+    monkeypatch.setattr(adc_client, "TOKEN_REFRESH_MARGIN", 0.2)
+    monkeypatch.setattr(adc_client, "TOKEN_MIN_REFRESH_DELAY", 0.05)
+    deadlines = asyncio.run(_logins(0.3, 0.25))
+
+    assert deadlines[0] is not None
+    assert len(deadlines) >= 2
+    # Long after the first deadline expired
+    assert deadlines[1:] == [None] * (len(deadlines) - 1)
+
+
+def test_short_tokens_are_not_refreshed_in_a_loop(monkeypatch):
+    monkeypatch.setattr(adc_client, "TOKEN_REFRESH_MARGIN", 10)
+    monkeypatch.setattr(adc_client, "TOKEN_MIN_REFRESH_DELAY", 0.2)
+    deadlines = asyncio.run(_logins(0.3, 0.5))
+
+    # The first login and one refresh every TOKEN_MIN_REFRESH_DELAY at most
+    assert len(deadlines) <= 3